@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Multiprocess self-play: K actor processes play games with a periodically
+refreshed copy of the DQN weights and stream transitions to one learner.
+
+Actors run selfplay.play_game without training and send each finished game's
+transitions over a bounded queue. The bounded queue is the back-pressure: when
+the learner falls behind, actors block on put instead of piling transitions up
+in memory. The learner (the main process) stores the transitions, runs
+optimize_model once per transition like the single-process trainer (so
+--replay-ratio and --steps-per-block apply the same way), and
+republishes its weights into shared memory every --sync-every games.
+
+    python actor_pool.py --actors 16 --games 20000 --sync-every 20
+"""
+import argparse
+import multiprocessing as mp
+import queue
+import random
+import time
+
+import torch
+
+from ai_dqn import DQN, DeepQAgent
+from engine import PLAYERS
+from selfplay import add_training_args, check_training_args, load_agents, play_game, positions, save_checkpoint
+
+
+def publish_weights(agents, shared_nets, lock, version):
+    with lock:
+        for agent, shared in zip(agents, shared_nets):
+            shared.load_state_dict(agent.policy_net.state_dict())
+        version.value += 1
+
+
+def actor_main(actor_id, shared_nets, lock, version, transitions, stop, epsilon, max_plies, seed, book=None):
+    torch.set_num_threads(1)
+    random.seed(seed + actor_id)
+    torch.manual_seed(seed + actor_id)
+    agents = (DeepQAgent('X', epsilon=epsilon), DeepQAgent('O', epsilon=epsilon))
+    if book:
+        from opening_book import OpeningBook
+        agents[0].book = agents[1].book = OpeningBook(book)
+    local_version = -1
+
+    while not stop.is_set():
+        if version.value != local_version:
+            with lock:
+                for agent, shared in zip(agents, shared_nets):
+                    agent.policy_net.load_state_dict(shared.state_dict())
+                local_version = version.value
+
+        game = []
+        def record(player, state, action, reward, next_state, done):
+            game.append((player, state, action, reward, next_state, done))
+        winner, moves = play_game(agents[0], agents[1], max_plies=max_plies, record=record)
+
+        while not stop.is_set():
+            try:
+                transitions.put((winner, len(moves), game), timeout=0.5)
+                break
+            except queue.Full:
+                continue
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Multiprocess Morabaraba self-play with a central learner.")
+    add_training_args(parser)
+    parser.add_argument("--actors", type=int, default=max(mp.cpu_count() - 1, 1),
+                        help="number of actor processes")
+    parser.add_argument("--sync-every", type=int, default=10,
+                        help="publish learner weights to the actors every N games")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="max finished games waiting for the learner before actors block")
+    args = parser.parse_args(argv)
+    check_training_args(parser, args)
+    if args.actors < 1 or args.sync_every < 1 or args.queue_size < 1:
+        parser.error("--actors, --sync-every and --queue-size must be positive")
+    return args
+
+
+def next_game(transitions, actors):
+    """Next finished game from the actors; raises RuntimeError once none are left to send one."""
+    while True:
+        try:
+            return transitions.get(timeout=1.0)
+        except queue.Empty:
+            if not any(actor.is_alive() for actor in actors):
+                raise RuntimeError("every actor process has exited; the learner has no games left to wait for")
+
+
+def queue_depth(transitions):
+    # Queue.qsize is not implemented on macOS (no sem_getvalue).
+    try:
+        return f", queue ~{transitions.qsize()}"
+    except NotImplementedError:
+        return ""
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    random.seed(seed)
+    torch.manual_seed(seed)
+
+    agents = load_agents(args)
+    ctx = mp.get_context("spawn")
+    shared_nets = []
+    for agent in agents:
+        net = DQN(agent.input_size, agent.output_size)
+        net.share_memory()
+        shared_nets.append(net)
+    lock = ctx.Lock()
+    version = ctx.Value('i', 0)
+    publish_weights(agents, shared_nets, lock, version)
+    transitions = ctx.Queue(maxsize=args.queue_size)
+    stop = ctx.Event()
+
+    actors = [ctx.Process(target=actor_main, daemon=True,
+                          args=(i, shared_nets, lock, version, transitions, stop,
+                                args.epsilon, args.max_plies, seed, args.book))
+              for i in range(args.actors)]
+    for actor in actors:
+        actor.start()
+
+    win_counts = {'X': 0, 'O': 0, None: 0}
+    total_moves = 0
+    start = time.time()
+    try:
+        for game in range(1, args.games + 1):
+            winner, num_moves, game_transitions = next_game(transitions, actors)
+            for player, state, action, reward, next_state, done in game_transitions:
+                agent = agents[player]
+                agent.store_transition(state, positions, action, reward, next_state, done)
+                agent.optimize_model()
+            win_counts[PLAYERS[winner] if winner is not None else None] += 1
+            total_moves += num_moves
+
+            if game % args.sync_every == 0:
+                publish_weights(agents, shared_nets, lock, version)
+            if args.log_every and game % args.log_every == 0:
+                elapsed = time.time() - start
+                print(f"game {game}: wins X {win_counts['X']} O {win_counts['O']} unfinished {win_counts[None]} | "
+                      f"{game / elapsed:.1f} games/s, {total_moves / elapsed:.0f} moves/s"
+                      f"{queue_depth(transitions)}")
+            if args.checkpoint_every and game % args.checkpoint_every == 0:
+                save_checkpoint(agents, args)
+    finally:
+        stop.set()
+        # Drain so actors blocked on a full queue can see the stop flag and exit.
+        while any(actor.is_alive() for actor in actors):
+            try:
+                transitions.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for actor in actors:
+            actor.join()
+
+    save_checkpoint(agents, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,13 @@ import numpy as np
 import pickle
 import os
 
+from engine import ZOBRIST_PIECES
+from symmetry import INVERSE_ARRAY, NUM_SYMMETRIES, PERM_ARRAY
+
+# Zobrist keys for a state array's own and opponent pieces (q_cache keys).
+ZOBRIST_OWN = np.array(ZOBRIST_PIECES[0], dtype=np.uint64)
+ZOBRIST_OPP = np.array(ZOBRIST_PIECES[1], dtype=np.uint64)
+
 # Define the neural network model for approximating Q-values.
 class DQN(nn.Module):
     def __init__(self, input_size, output_size):
@@ -20,25 +27,154 @@ class DQN(nn.Module):
         x = self.fc3(x)
         return x
 
-# Experience replay buffer.
+# Experience replay buffer: preallocated arrays used as a ring, so push is O(1)
+# and a sampled batch is a single fancy-index per field.
 class ReplayBuffer:
-    def __init__(self, capacity):
+    def __init__(self, capacity, state_size=24):
         self.capacity = capacity
-        self.buffer = []
+        self.states = np.zeros((capacity, state_size), dtype=np.int8)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.int8)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.position = 0  # Next slot to write; the oldest entry once full.
+        self.size = 0
+        self.rng = np.random.default_rng()
     
     def push(self, state, action, reward, next_state, done):
-        if len(self.buffer) >= self.capacity:
-            self.buffer.pop(0)
-        self.buffer.append((state, action, reward, next_state, done))
+        i = self.position
+        self.states[i] = np.asarray(state).reshape(-1)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = np.asarray(next_state).reshape(-1)
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def sample_indices(self, batch_size):
+        # A block of batches larger than the buffer has to repeat transitions.
+        return self.rng.choice(self.size, batch_size, replace=batch_size > self.size)
+    
+    def gather(self, indices):
+        """Return the transitions at indices as batched tensors ready for optimize_model."""
+        return (torch.from_numpy(self.states[indices].astype(np.float32)),
+                torch.from_numpy(self.actions[indices].astype(np.int64)).unsqueeze(1),
+                torch.from_numpy(self.rewards[indices]).unsqueeze(1),
+                torch.from_numpy(self.next_states[indices].astype(np.float32)),
+                torch.from_numpy(self.dones[indices].astype(np.float32)).unsqueeze(1))
     
     def sample(self, batch_size):
-        return random.sample(self.buffer, batch_size)
+        return self.gather(self.sample_indices(batch_size))
     
     def __len__(self):
-        return len(self.buffer)
+        return self.size
+
+    @classmethod
+    def from_legacy(cls, old):
+        """Convert a pickled list-of-tensors ReplayBuffer from older versions."""
+        buffer = cls(old.capacity)
+        for state, action, reward, next_state, done in old.buffer:
+            buffer.push(state.numpy(), action, reward, next_state.numpy(), done)
+        return buffer
+
+# Binary sum tree over priorities in a flat array: node n has children 2n and
+# 2n + 1, the root is node 1 and leaf i lives at leaf_start + i.
+class SumTree:
+    def __init__(self, capacity):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.leaf_start = size
+        self.tree = np.zeros(2 * size, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[np.asarray(indices) + self.leaf_start]
+
+    def set(self, index, priority):
+        node = index + self.leaf_start
+        tree = self.tree
+        tree[node] = priority
+        node //= 2
+        while node:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+
+    def set_many(self, indices, priorities):
+        nodes = np.asarray(indices) + self.leaf_start
+        self.tree[nodes] = priorities
+        # All leaves share one depth, so parents can be refreshed a level at a time.
+        while True:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+
+    def find(self, values):
+        """Leaf index for each prefix-sum value, walking all values down the tree together."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaf_start:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values > left_sum
+            values = np.where(go_right, values - left_sum, values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.leaf_start
+
+# Prioritized experience replay (proportional variant). Transitions are drawn
+# with probability p_i^alpha / sum_k p_k^alpha where p_i is the last TD error,
+# and importance-sampling weights correct the resulting bias.
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(self, capacity, state_size=24, alpha=0.6, beta=0.4, beta_steps=100000, eps=1e-5):
+        super().__init__(capacity, state_size)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = (1.0 - beta) / beta_steps
+        self.eps = eps
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def push(self, state, action, reward, next_state, done):
+        # New transitions get the highest priority seen so they are replayed at least once.
+        self.tree.set(self.position, self.max_priority ** self.alpha)
+        super().push(state, action, reward, next_state, done)
+
+    def sample_prioritized(self, batch_size):
+        """Return (indices, weights) drawn proportionally to priority, one per equal-mass segment."""
+        total = self.tree.total()
+        segment = total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+        probs = self.tree.get(indices) / total
+        weights = (self.size * probs) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return indices, torch.from_numpy(weights.astype(np.float32)).unsqueeze(1)
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.set_many(indices, priorities ** self.alpha)
+
+    @classmethod
+    def from_buffer(cls, buffer, **kwargs):
+        """Wrap the contents of a uniform ReplayBuffer, giving every transition equal priority."""
+        per = cls(buffer.capacity, buffer.states.shape[1], **kwargs)
+        for name in ("states", "actions", "rewards", "next_states", "dones"):
+            getattr(per, name)[:] = getattr(buffer, name)
+        per.position = buffer.position
+        per.size = buffer.size
+        if per.size:
+            per.tree.set_many(np.arange(per.size), np.ones(per.size))
+        return per
 
 class DeepQAgent:
-    def __init__(self, player, lr=0.001, gamma=0.9, epsilon=0.2, buffer_capacity=10000, batch_size=32):
+    def __init__(self, player, lr=0.001, gamma=0.9, epsilon=0.2, buffer_capacity=10000, batch_size=32,
+                 prioritized=False, per_alpha=0.6, per_beta=0.4, augment=0, replay_ratio=1.0,
+                 steps_per_block=1):
         self.player = player
         self.lr = lr
         self.gamma = gamma
@@ -51,8 +187,27 @@ class DeepQAgent:
         self.target_net = DQN(self.input_size, self.output_size)
         self.target_net.load_state_dict(self.policy_net.state_dict())
         self.optimizer = optim.Adam(self.policy_net.parameters(), lr=self.lr)
-        self.replay_buffer = ReplayBuffer(buffer_capacity)
+        self.prioritized = prioritized
+        self.per_alpha = per_alpha
+        self.per_beta = per_beta
+        # Train each sampled transition under this many random board symmetries (0 = off).
+        self.augment = augment
+        # Optional opening_book.OpeningBook: book positions are answered without the network.
+        self.book = None
+        # Training schedule: replay_ratio gradient steps per optimize_model call
+        # (one per environment step) on average, run steps_per_block at a time
+        # on batches gathered from the buffer together.
+        self.replay_ratio = replay_ratio
+        self.steps_per_block = steps_per_block
+        self.update_credit = 0.0
+        if prioritized:
+            self.replay_buffer = PrioritizedReplayBuffer(buffer_capacity, alpha=per_alpha, beta=per_beta)
+        else:
+            self.replay_buffer = ReplayBuffer(buffer_capacity)
         self.steps_done = 0
+        self.model_version = 0  # Bumped whenever policy_net's weights change, for output caches.
+        # Optional ttable.TranspositionTable with q_size=24: Q-values per (position, model_version).
+        self.q_cache = None
         self.update_target_every = 1000  # Update target network every 1000 steps.
         
         # Variables to store last state information.
@@ -60,31 +215,33 @@ class DeepQAgent:
         self.last_positions = None
         self.last_action = None
 
-    def get_state_tensor(self, board_state, positions):
-        state_list = []
-        for pos in sorted(positions.keys()):
+    def get_state_array(self, board_state, positions):
+        """Board encoding as int8 (1 own, -1 opponent, 0 empty), the replay buffer's format."""
+        state = np.zeros(self.input_size, dtype=np.int8)
+        for i, pos in enumerate(sorted(positions.keys())):
             val = board_state[pos]
-            if val is None:
-                state_list.append(0.0)
-            elif val == self.player:
-                state_list.append(1.0)
-            else:
-                state_list.append(-1.0)
-        return torch.tensor(state_list, dtype=torch.float32).unsqueeze(0)
+            if val is not None:
+                state[i] = 1 if val == self.player else -1
+        return state
+
+    def get_state_tensor(self, board_state, positions):
+        state = self.get_state_array(board_state, positions)
+        return torch.from_numpy(state.astype(np.float32)).unsqueeze(0)
     
     def select_action(self, board_state, positions):
-        state = self.get_state_tensor(board_state, positions)
-        if random.random() < self.epsilon:
+        action = None
+        if self.book is not None:
+            action = self.book.choose_state(self.get_state_array(board_state, positions))
+        if action is None and random.random() < self.epsilon:
             empty_indices = [i for i, pos in enumerate(sorted(positions.keys())) if board_state[pos] is None]
             action = random.choice(empty_indices) if empty_indices else None
-        else:
-            with torch.no_grad():
-                q_values = self.policy_net(state).squeeze(0).numpy()
-                # Mask non-empty positions.
-                for i, pos in enumerate(sorted(positions.keys())):
-                    if board_state[pos] is not None:
-                        q_values[i] = -float('inf')
-                action = int(np.argmax(q_values))
+        elif action is None:
+            q_values = self.get_q_values(board_state, positions)
+            # Mask non-empty positions.
+            for i, pos in enumerate(sorted(positions.keys())):
+                if board_state[pos] is not None:
+                    q_values[i] = -float('inf')
+            action = int(np.argmax(q_values))
         # Save current board state and positions for later use.
         self.last_state = board_state.copy()  # copy to preserve current state
         self.last_positions = positions
@@ -92,35 +249,84 @@ class DeepQAgent:
         return action
 
     def store_transition(self, board_state, positions, action, reward, next_board_state, done):
-        state_tensor = self.get_state_tensor(board_state, positions)
-        next_state_tensor = self.get_state_tensor(next_board_state, positions)
-        self.replay_buffer.push(state_tensor, action, reward, next_state_tensor, done)
+        state = self.get_state_array(board_state, positions)
+        next_state = self.get_state_array(next_board_state, positions)
+        self.replay_buffer.push(state, action, reward, next_state, done)
 
     def optimize_model(self):
         if len(self.replay_buffer) < self.batch_size:
             return
-        transitions = self.replay_buffer.sample(self.batch_size)
-        batch_state, batch_action, batch_reward, batch_next_state, batch_done = zip(*transitions)
-        
-        batch_state = torch.cat(batch_state)
-        batch_action = torch.tensor(batch_action, dtype=torch.int64).unsqueeze(1)
-        batch_reward = torch.tensor(batch_reward, dtype=torch.float32).unsqueeze(1)
-        batch_next_state = torch.cat(batch_next_state)
-        batch_done = torch.tensor(batch_done, dtype=torch.float32).unsqueeze(1)
+        self.update_credit += self.replay_ratio
+        while self.update_credit >= self.steps_per_block:
+            self.update_credit -= self.steps_per_block
+            self.train_block(self.steps_per_block)
+
+    def train_block(self, steps):
+        """Run steps gradient steps back to back on one block of steps * batch_size sampled transitions."""
+        size = self.batch_size
+        if self.prioritized:
+            indices, weights = self.replay_buffer.sample_prioritized(steps * size)
+        else:
+            indices, weights = self.replay_buffer.sample_indices(steps * size), None
+        block = self.replay_buffer.gather(indices)
+        if steps > 1:
+            # Prioritized draws come out ordered by segment and the memmap store sorts its
+            # reads, so shuffle the block to make every step's slice a fair sample.
+            order = torch.randperm(steps * size)
+            block = tuple(field[order] for field in block)
+            if self.prioritized:
+                indices, weights = indices[order.numpy()], weights[order]
+        for step in range(steps):
+            rows = slice(step * size, (step + 1) * size)
+            batch = tuple(field[rows] for field in block)
+            if self.prioritized:
+                self.train_step(batch, indices[rows], weights[rows])
+            else:
+                self.train_step(batch)
+
+    def train_step(self, batch, indices=None, weights=None):
+        if self.augment:
+            batch = self.augment_batch(batch)
+        batch_state, batch_action, batch_reward, batch_next_state, batch_done = batch
         
         current_q = self.policy_net(batch_state).gather(1, batch_action)
         next_q = self.target_net(batch_next_state).max(1)[0].detach().unsqueeze(1)
         expected_q = batch_reward + self.gamma * next_q * (1 - batch_done)
         
-        loss = nn.MSELoss()(current_q, expected_q)
+        if self.prioritized:
+            # Importance-sampling weighted MSE; the TD errors become the new priorities.
+            td_error = expected_q - current_q
+            copies = max(self.augment, 1)
+            loss = (weights.repeat(copies, 1) * td_error.pow(2)).mean()
+            # Copies of a transition are stacked copy-major; average their errors per transition.
+            errors = td_error.detach().abs().view(copies, -1).mean(0).numpy()
+            self.replay_buffer.update_priorities(indices, errors)
+        else:
+            loss = nn.MSELoss()(current_q, expected_q)
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+        self.model_version += 1
         
         self.steps_done += 1
         if self.steps_done % self.update_target_every == 0:
             self.target_net.load_state_dict(self.policy_net.state_dict())
 
+    def augment_batch(self, batch):
+        """
+        Stack self.augment images of the batch, each transition under distinct
+        random symmetries. Rewards and done flags are unchanged by symmetry.
+        """
+        states, actions, rewards, next_states, dones = batch
+        n = len(actions)
+        symmetries = np.argsort(np.random.rand(n, NUM_SYMMETRIES), axis=1)[:, :self.augment].T.reshape(-1)
+        inverse = torch.from_numpy(INVERSE_ARRAY[symmetries])
+        copies = self.augment
+        states, next_states = states.repeat(copies, 1), next_states.repeat(copies, 1)
+        actions = torch.from_numpy(PERM_ARRAY[symmetries, actions.repeat(copies, 1).squeeze(1).numpy()]).unsqueeze(1)
+        return (states.gather(1, inverse), actions, rewards.repeat(copies, 1),
+                next_states.gather(1, inverse), dones.repeat(copies, 1))
+
     def update(self, reward, board_state, positions):
         """
         Called at game end to record a terminal transition with the given reward.
@@ -136,9 +342,18 @@ class DeepQAgent:
         Returns raw Q-values for the current board state.
         Useful for visualizing the agent's preferences.
         """
-        state_tensor = self.get_state_tensor(board_state, positions)
+        state = self.get_state_array(board_state, positions)
+        key = None
+        if self.q_cache is not None:
+            key = int(np.bitwise_xor.reduce(ZOBRIST_OWN[state == 1])
+                      ^ np.bitwise_xor.reduce(ZOBRIST_OPP[state == -1]))
+            cached = self.q_cache.probe_q(key, self.model_version)
+            if cached is not None:
+                return cached.copy()
         with torch.no_grad():
-            q_values = self.policy_net(state_tensor).squeeze(0).numpy()
+            q_values = self.policy_net(torch.from_numpy(state.astype(np.float32)).unsqueeze(0)).squeeze(0).numpy()
+        if key is not None:
+            self.q_cache.store_q(key, q_values, self.model_version)
         return q_values
     
     def save_model(self, path):
@@ -148,6 +363,7 @@ class DeepQAgent:
         if os.path.exists(path):
             self.policy_net.load_state_dict(torch.load(path))
             self.target_net.load_state_dict(torch.load(path))
+            self.model_version += 1
             self.policy_net.eval()  # Set the model to evaluation mode for inference
 
     def save_replay_buffer(self, path):
@@ -157,4 +373,9 @@ class DeepQAgent:
     def load_replay_buffer(self, path):
         if os.path.exists(path):
             with open(path, "rb") as f:
-                self.replay_buffer = pickle.load(f)
\ No newline at end of file
+                buffer = pickle.load(f)
+            if hasattr(buffer, "buffer"):  # Pickled by the old list-based ReplayBuffer.
+                buffer = ReplayBuffer.from_legacy(buffer)
+            if self.prioritized and not isinstance(buffer, PrioritizedReplayBuffer):
+                buffer = PrioritizedReplayBuffer.from_buffer(buffer, alpha=self.per_alpha, beta=self.per_beta)
+            self.replay_buffer = buffer
\ No newline at end of file
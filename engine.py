@@ -0,0 +1,383 @@
+"""
+Headless bitboard rules engine for Morabaraba.
+
+The board is stored as two 24-bit integers, one per player. Bit i is set when
+the player has a piece on POINTS[i]; POINTS uses the same sorted order as
+DeepQAgent's state vector, so point indices and DQN action indices agree.
+The rules match runv4Revised.py: 12 pieces each, a mill lets the mover remove
+an opponent piece (pieces outside mills first), a player with three pieces
+may fly, and a player who has placed all pieces and is left with fewer than
+three loses. A player who cannot move in the moving phase also loses.
+
+Board.hash is a 64-bit Zobrist hash of the occupied points, side to move,
+phase and pieces placed (so pieces in hand), kept up to date by make_move and
+undo_move. Board.key() is the exact, collision-free alternative.
+"""
+import random
+
+TOTAL_PIECES = 12
+
+# Players, phases and move kinds are small ints so they can index lists.
+X, O = 0, 1
+PLAYERS = ('X', 'O')
+
+PLACING, MOVING, REMOVAL = 0, 1, 2
+PHASE_NAMES = ("placing", "moving", "removal")
+
+PLACE, MOVE, REMOVE = 0, 1, 2
+ACTION_NAMES = ("place", "move", "capture")
+
+# Board points in DeepQAgent order (sorted(positions.keys())).
+POINTS = (
+    "a1", "a4", "a7", "b2", "b4", "b6", "c3", "c4", "c5",
+    "d1", "d2", "d3", "d5", "d6", "d7", "e3", "e4", "e5",
+    "f2", "f4", "f6", "g1", "g4", "g7",
+)
+POINT_INDEX = {name: i for i, name in enumerate(POINTS)}
+NUM_POINTS = len(POINTS)
+FULL_MASK = (1 << NUM_POINTS) - 1
+
+MILLS = (
+    ("a1", "a4", "a7"), ("b2", "b4", "b6"), ("c3", "c4", "c5"),
+    ("d1", "d2", "d3"), ("d5", "d6", "d7"), ("e3", "e4", "e5"),
+    ("f2", "f4", "f6"), ("g1", "g4", "g7"), ("a1", "d1", "g1"),
+    ("a4", "b4", "c4"), ("a7", "d7", "g7"), ("b2", "d2", "f2"),
+    ("b6", "d6", "f6"), ("c3", "d3", "e3"), ("c5", "d5", "e5"),
+    ("e4", "f4", "g4"),
+)
+
+ADJACENT = {
+    "a1": ("a4", "d1", "b2"), "a4": ("a1", "a7", "b4"), "a7": ("a4", "d7", "b6"),
+    "b2": ("b4", "d2", "c3", "a1"), "b4": ("b2", "b6", "a4", "c4"),
+    "b6": ("b4", "d6", "c5", "a7"), "c3": ("c4", "b2", "d3"),
+    "c4": ("c3", "c5", "b4"), "c5": ("c4", "b6", "d5"),
+    "d1": ("a1", "d2", "g1"), "d2": ("d1", "d3", "b2", "f2"),
+    "d3": ("d2", "c3", "e3"), "d5": ("d6", "c5", "e5"),
+    "d6": ("d5", "d7", "b6", "f6"), "d7": ("d6", "a7", "g7"),
+    "e3": ("e4", "d3", "f2"), "e4": ("e3", "e5", "f4"),
+    "e5": ("e4", "d5", "f6"), "f2": ("f4", "d2", "e3", "g1"),
+    "f4": ("f2", "f6", "e4", "g4"), "f6": ("f4", "d6", "e5", "g7"),
+    "g1": ("g4", "d1", "f2"), "g4": ("g1", "g7", "f4"), "g7": ("g4", "d7", "f6"),
+}
+
+# Precomputed bit masks.
+POINT_MASKS = tuple(1 << i for i in range(NUM_POINTS))
+MILL_POINTS = tuple(tuple(POINT_INDEX[p] for p in mill) for mill in MILLS)
+MILL_MASKS = tuple(sum(POINT_MASKS[i] for i in mill) for mill in MILL_POINTS)
+# Every point lies on exactly two mills; mill detection only looks at those.
+POINT_MILLS = tuple(tuple(m for m, mill in enumerate(MILL_POINTS) if i in mill)
+                    for i in range(NUM_POINTS))
+POINT_MILL_MASKS = tuple(tuple(MILL_MASKS[m] for m in mills) for mills in POINT_MILLS)
+ADJ_POINTS = tuple(tuple(POINT_INDEX[p] for p in ADJACENT[name]) for name in POINTS)
+ADJ_MASKS = tuple(sum(POINT_MASKS[i] for i in adj) for adj in ADJ_POINTS)
+
+# Zobrist keys. The seed is fixed so hashes agree across runs and processes
+# and can be stored in files.
+_zobrist_rng = random.Random(0x4D4F5241)
+ZOBRIST_PIECES = tuple(tuple(_zobrist_rng.getrandbits(64) for _ in range(NUM_POINTS)) for _ in PLAYERS)
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)  # Xored in when O is to move.
+ZOBRIST_PHASE = tuple(_zobrist_rng.getrandbits(64) for _ in PHASE_NAMES)
+ZOBRIST_PLACED = tuple(tuple(_zobrist_rng.getrandbits(64) for _ in range(TOTAL_PIECES + 1)) for _ in PLAYERS)
+del _zobrist_rng
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count("1")
+
+
+def iter_bits(bits):
+    """Yield the point indices of the set bits, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+# Moves are packed into a single int: kind in bits 10-11, from in 5-9, to in 0-4.
+def encode_move(kind, frm, to):
+    return (kind << 10) | (frm << 5) | to
+
+def move_kind(move):
+    return move >> 10
+
+def move_from(move):
+    return (move >> 5) & 31
+
+def move_to(move):
+    return move & 31
+
+def move_to_str(move):
+    kind = move_kind(move)
+    if kind == MOVE:
+        return f"{POINTS[move_from(move)]}-{POINTS[move_to(move)]}"
+    if kind == REMOVE:
+        return f"x{POINTS[move_to(move)]}"
+    return POINTS[move_to(move)]
+
+
+def forms_mill(bits, idx):
+    """True if the piece on point idx is part of a mill in bits."""
+    first, second = POINT_MILL_MASKS[idx]
+    return bits & first == first or bits & second == second
+
+def mill_points(bits):
+    """Mask of every point of bits that belongs to a completed mill."""
+    covered = 0
+    for mask in MILL_MASKS:
+        if bits & mask == mask:
+            covered |= mask
+    return covered
+
+def removable_mask(bits):
+    """Pieces of bits that may be removed: those outside mills, or any if all are in mills."""
+    free = bits & ~mill_points(bits)
+    return free if free else bits
+
+
+NUM_MILLS = len(MILLS)
+
+
+class Board:
+    def __init__(self, current_player=X):
+        self.pieces = [0, 0]
+        self.placed = [0, 0]
+        self.removed = [0, 0]
+        self.current = current_player
+        self.phase = PLACING
+        self.history = []
+        # mill_counts[p][m] is how many pieces p has on mill m. open_lines[p][k]
+        # is how many mills hold k pieces of p and none of the opponent, so
+        # open_lines[p][2] are mill threats and open_lines[p][3] closed mills.
+        self.mill_counts = [[0] * NUM_MILLS, [0] * NUM_MILLS]
+        self.open_lines = [[NUM_MILLS, 0, 0, 0], [NUM_MILLS, 0, 0, 0]]
+        self.hash = self.zobrist()
+
+    @classmethod
+    def from_dict(cls, board_state, current_player, pieces_placed, phase, removed_count=None):
+        """Build a board from the runner globals (board_state, current_player, ...)."""
+        board = cls(PLAYERS.index(current_player))
+        for name, val in board_state.items():
+            if val is not None:
+                board.pieces[PLAYERS.index(val)] |= POINT_MASKS[POINT_INDEX[name]]
+        board.placed = [pieces_placed['X'], pieces_placed['O']]
+        if removed_count is not None:
+            board.removed = [removed_count['X'], removed_count['O']]
+        board.phase = PHASE_NAMES.index(phase)
+        board.recount()
+        return board
+
+    def to_dict(self):
+        """Return the position as a runner-style board_state dict."""
+        x_bits, o_bits = self.pieces
+        state = {}
+        for i, name in enumerate(POINTS):
+            bit = POINT_MASKS[i]
+            state[name] = 'X' if x_bits & bit else 'O' if o_bits & bit else None
+        return state
+
+    def copy(self):
+        board = Board(self.current)
+        board.pieces = self.pieces[:]
+        board.placed = self.placed[:]
+        board.removed = self.removed[:]
+        board.phase = self.phase
+        board.mill_counts = [self.mill_counts[0][:], self.mill_counts[1][:]]
+        board.open_lines = [self.open_lines[0][:], self.open_lines[1][:]]
+        board.hash = self.hash
+        return board
+
+    def zobrist(self):
+        """Zobrist hash of the position computed from scratch."""
+        h = ZOBRIST_PHASE[self.phase] ^ ZOBRIST_PLACED[X][self.placed[X]] ^ ZOBRIST_PLACED[O][self.placed[O]]
+        if self.current == O:
+            h ^= ZOBRIST_SIDE
+        for player in (X, O):
+            keys = ZOBRIST_PIECES[player]
+            for idx in iter_bits(self.pieces[player]):
+                h ^= keys[idx]
+        return h
+
+    def recount(self):
+        """Rebuild the mill counters and hash from the bitboards after editing the board directly."""
+        self.hash = self.zobrist()
+        self.mill_counts = [[0] * NUM_MILLS, [0] * NUM_MILLS]
+        self.open_lines = [[NUM_MILLS, 0, 0, 0], [NUM_MILLS, 0, 0, 0]]
+        for player in (X, O):
+            for idx in iter_bits(self.pieces[player]):
+                self._count_piece(player, idx, 1)
+
+    def _count_piece(self, player, idx, delta):
+        # A piece arriving on (delta=1) or leaving (delta=-1) point idx only
+        # changes the two mills through that point.
+        own = self.mill_counts[player]
+        opp = self.mill_counts[1 - player]
+        own_lines = self.open_lines[player]
+        opp_lines = self.open_lines[1 - player]
+        for m in POINT_MILLS[idx]:
+            n = own[m]
+            if opp[m] == 0:
+                own_lines[n] -= 1
+                own_lines[n + delta] += 1
+            if n == 0:
+                opp_lines[opp[m]] -= 1
+            elif n == 1 and delta < 0:
+                opp_lines[opp[m]] += 1
+            own[m] = n + delta
+
+    def set_point(self, idx, player):
+        """
+        Put a piece of player on point idx, or clear it (player None), keeping
+        the mill counters and hash in step. For callers that edit the position
+        directly, like the pygame runner; play goes through make_move.
+        """
+        for p in (X, O):
+            if self.pieces[p] >> idx & 1:
+                self.pieces[p] ^= POINT_MASKS[idx]
+                self.hash ^= ZOBRIST_PIECES[p][idx]
+                self._count_piece(p, idx, -1)
+        if player is not None:
+            self.pieces[player] |= POINT_MASKS[idx]
+            self.hash ^= ZOBRIST_PIECES[player][idx]
+            self._count_piece(player, idx, 1)
+
+    def mill_setup_reward(self, player):
+        """Same value as calculate_mill_setup_reward, read from the counters."""
+        lines = self.open_lines[player]
+        return 2.0 * lines[2] + 0.5 * lines[1]
+
+    def block_opponent_reward(self, player):
+        """Same value as calculate_block_opponent_reward, read from the counters."""
+        return 1.5 * self.open_lines[1 - player][2]
+
+    def encode(self, player):
+        """State vector from player's view (1 own, -1 opponent, 0 empty), like get_state_tensor."""
+        own, opp = self.pieces[player], self.pieces[1 - player]
+        return [1.0 if own >> i & 1 else -1.0 if opp >> i & 1 else 0.0 for i in range(NUM_POINTS)]
+
+    def key(self):
+        """
+        Exact 59-bit position key: both bitboards, side to move, phase and
+        pieces placed. Fits a signed 64-bit integer (e.g. an SQLite INTEGER).
+        """
+        return (self.pieces[0] | self.pieces[1] << 24 | self.current << 48 | self.phase << 49
+                | self.placed[0] << 51 | self.placed[1] << 55)
+
+    def empty_mask(self):
+        return FULL_MASK & ~(self.pieces[0] | self.pieces[1])
+
+    def count(self, player):
+        return popcount(self.pieces[player])
+
+    def can_fly(self, player):
+        return popcount(self.pieces[player]) <= 3
+
+    def legal_moves(self):
+        current = self.current
+        empty = self.empty_mask()
+        if self.phase == PLACING:
+            return [encode_move(PLACE, 0, to) for to in iter_bits(empty)]
+        if self.phase == REMOVAL:
+            targets = removable_mask(self.pieces[1 - current])
+            return [encode_move(REMOVE, 0, to) for to in iter_bits(targets)]
+        moves = []
+        flying = self.can_fly(current)
+        for frm in iter_bits(self.pieces[current]):
+            dests = empty if flying else ADJ_MASKS[frm] & empty
+            for to in iter_bits(dests):
+                moves.append(encode_move(MOVE, frm, to))
+        return moves
+
+    def is_legal(self, move):
+        return move in self.legal_moves()
+
+    def make_move(self, move):
+        """Apply a legal move. Returns True if it formed a mill."""
+        current = self.current
+        phase = self.phase
+        self.history.append((move, self.pieces[0], self.pieces[1], self.placed[0], self.placed[1],
+                             self.removed[0], self.removed[1], current, phase, self.hash))
+        kind = move >> 10
+        to = move & 31
+        if kind == REMOVE:
+            opp = 1 - current
+            self.pieces[opp] &= ~POINT_MASKS[to]
+            self._count_piece(opp, to, -1)
+            self.removed[opp] += 1
+            self.phase = self._next_phase()
+            self.current = opp
+            self.hash ^= (ZOBRIST_PIECES[opp][to] ^ ZOBRIST_PHASE[phase]
+                          ^ ZOBRIST_PHASE[self.phase] ^ ZOBRIST_SIDE)
+            return False
+        keys = ZOBRIST_PIECES[current]
+        if kind == PLACE:
+            self.pieces[current] |= POINT_MASKS[to]
+            placed = self.placed[current]
+            self.placed[current] = placed + 1
+            h = self.hash ^ keys[to] ^ ZOBRIST_PLACED[current][placed] ^ ZOBRIST_PLACED[current][placed + 1]
+        else:
+            frm = (move >> 5) & 31
+            self.pieces[current] ^= POINT_MASKS[frm] | POINT_MASKS[to]
+            self._count_piece(current, frm, -1)
+            h = self.hash ^ keys[frm] ^ keys[to]
+        self._count_piece(current, to, 1)
+        first, second = POINT_MILLS[to]
+        counts = self.mill_counts[current]
+        if (counts[first] == 3 or counts[second] == 3) and self.pieces[1 - current]:
+            self.phase = REMOVAL
+            self.hash = h ^ ZOBRIST_PHASE[phase] ^ ZOBRIST_PHASE[REMOVAL]
+            return True
+        self.phase = self._next_phase()
+        self.current = 1 - current
+        self.hash = h ^ ZOBRIST_PHASE[phase] ^ ZOBRIST_PHASE[self.phase] ^ ZOBRIST_SIDE
+        return False
+
+    def undo_move(self):
+        (move, x_bits, o_bits, x_placed, o_placed,
+         x_removed, o_removed, self.current, self.phase, self.hash) = self.history.pop()
+        kind = move >> 10
+        to = move & 31
+        if kind == REMOVE:
+            self._count_piece(1 - self.current, to, 1)
+        else:
+            self._count_piece(self.current, to, -1)
+            if kind == MOVE:
+                self._count_piece(self.current, (move >> 5) & 31, 1)
+        self.pieces[0], self.pieces[1] = x_bits, o_bits
+        self.placed[0], self.placed[1] = x_placed, o_placed
+        self.removed[0], self.removed[1] = x_removed, o_removed
+
+    def _next_phase(self):
+        if self.placed[0] == TOTAL_PIECES and self.placed[1] == TOTAL_PIECES:
+            return MOVING
+        return PLACING
+
+    def winner(self):
+        """Return the winning player, or None while the game is still on."""
+        for player in (X, O):
+            if self.placed[player] == TOTAL_PIECES and popcount(self.pieces[player]) < 3:
+                return 1 - player
+        if self.phase == MOVING and not self.legal_moves():
+            return 1 - self.current
+        return None
+
+    def __str__(self):
+        state = self.to_dict()
+        cells = " ".join(f"{name}:{state[name] or '.'}" for name in POINTS)
+        return f"{PLAYERS[self.current]} to play ({PHASE_NAMES[self.phase]}) {cells}"
+
+
+def perft(board, depth):
+    """Count leaf positions reachable in depth plies; used to check and time move generation."""
+    if depth == 0:
+        return 1
+    moves = board.legal_moves()
+    if depth == 1:
+        return len(moves)
+    total = 0
+    for move in moves:
+        board.make_move(move)
+        total += perft(board, depth - 1)
+        board.undo_move()
+    return total
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Compact binary game records: two bytes per move instead of a ~150 byte JSON
+object.
+
+A file starts with the 8-byte MAGIC and is followed by game records. Each
+record is a 4-byte header (uint16 move count, uint8 winner, uint8 log
+version) and then one little-endian uint16 per move:
+
+    bit 12      player (0 = X, 1 = O)
+    bits 10-11  kind: engine.PLACE, engine.MOVE or engine.REMOVE ("capture")
+    bits 5-9    from point (engine.POINTS index, 0 when unused)
+    bits 0-4    to point (for a capture: the captured point)
+
+Bits 0-11 are exactly an engine move code. The player is stored per move
+rather than derived because the existing logs do not strictly alternate.
+Everything is 2-byte aligned, so decode_all views a whole file as one uint16
+array and unpacks every move with a handful of vectorized ops.
+
+    python game_codec.py morabararaba_dataset.jsonl games.bin
+"""
+import os
+import struct
+import sys
+
+import numpy as np
+
+from engine import ACTION_NAMES, MOVE, PLAYERS, POINT_INDEX, POINTS, REMOVE, Board
+
+MAGIC = b"MORAGMS1"
+HEADER = struct.Struct("<HBB")
+WINNER_CODES = {None: 0, 'X': 1, 'O': 2}
+WINNER_NAMES = (None, 'X', 'O')
+ACTION_KINDS = {name: kind for kind, name in enumerate(ACTION_NAMES)}
+
+
+def encode_moves(moves, players, winner, log_version=2):
+    """Record for engine move codes with the player (engine.X / engine.O) of each."""
+    if len(moves) > 0xFFFF:
+        raise ValueError("game too long for a record")
+    words = np.asarray(moves, dtype=np.uint16) | (np.asarray(players, dtype=np.uint16) << 12)
+    return HEADER.pack(len(moves), WINNER_CODES[winner], log_version) + words.astype("<u2").tobytes()
+
+
+def encode_game(game):
+    """Record for a game in log_move format ({"moves": [...], "winner": 'X'})."""
+    moves = []
+    players = []
+    for move in game["moves"]:
+        frm = POINT_INDEX[move["from"]] if move["from"] else 0
+        moves.append((ACTION_KINDS[move["action"]] << 10) | (frm << 5) | POINT_INDEX[move["to"]])
+        players.append(PLAYERS.index(move["player"]))
+    return encode_moves(moves, players, game["winner"], game.get("log_version", 1))
+
+
+def encode_played(moves, first_player, winner):
+    """Record for engine moves played from the empty board with first_player to move."""
+    board = Board(first_player)
+    players = []
+    for move in moves:
+        players.append(board.current)
+        board.make_move(move)
+    return encode_moves(moves, players, winner)
+
+
+def decode_game(data, offset=0):
+    """Decode one record at offset. Returns (game in log_move format, next offset)."""
+    length, winner, log_version = HEADER.unpack_from(data, offset)
+    start = offset + HEADER.size
+    words = np.frombuffer(data, dtype="<u2", count=length, offset=start)
+    moves = []
+    for turn, word in enumerate(words.tolist(), 1):
+        kind = (word >> 10) & 3
+        to = POINTS[word & 31]
+        moves.append({
+            "turn": turn,
+            "player": PLAYERS[word >> 12],
+            "action": ACTION_NAMES[kind],
+            "from": POINTS[(word >> 5) & 31] if kind == MOVE else None,
+            "to": to,
+            "captured": to if kind == REMOVE else None,
+        })
+    game = {"moves": moves, "winner": WINNER_NAMES[winner]}
+    if log_version > 1:
+        game["log_version"] = log_version
+    return game, start + 2 * length
+
+
+# File size after this process's last append per path, so a file is only
+# rescanned for a torn tail when something else has written to it.
+_clean_ends = {}
+
+
+def _complete_end(data):
+    """Offset just past the last complete record in data."""
+    offset = len(MAGIC)
+    while offset + HEADER.size <= len(data):
+        end = offset + HEADER.size + 2 * HEADER.unpack_from(data, offset)[0]
+        if end > len(data):
+            break
+        offset = end
+    return offset
+
+
+def append_game(path, record):
+    """
+    Append one encoded record (from encode_game / encode_moves) and force it
+    to disk. A record cut short by an earlier crash is cut off first, since
+    readers follow the length chain and it would swallow every later record.
+    """
+    key = os.path.abspath(path)
+    with open(path, "ab+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            f.write(MAGIC)
+        elif _clean_ends.get(key) != size:
+            f.seek(0)
+            end = _complete_end(f.read())
+            if end < size:
+                f.truncate(end)
+        f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+        _clean_ends[key] = f.tell()
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a game record file")
+    return data
+
+
+def iter_games(path):
+    """Yield games from a record file in log_move format, stopping at a truncated tail."""
+    data = _read(path)
+    offset = len(MAGIC)
+    end = _complete_end(data)
+    while offset < end:
+        game, offset = decode_game(data, offset)
+        yield game
+
+
+def decode_all(path):
+    """
+    Decode a whole file into flat NumPy arrays. Per game: winner (0 none,
+    1 X, 2 O), length, and offsets so moves of game g are [offsets[g],
+    offsets[g + 1]). Per move: game, player, kind, frm, to.
+    """
+    data = _read(path)
+    # A crash mid-append can leave an odd byte; the scan below drops the partial record.
+    words = np.frombuffer(data, dtype="<u2", count=(len(data) - len(MAGIC)) // 2, offset=len(MAGIC))
+    # Headers are chained by their lengths, so find them with a light scan.
+    starts = []
+    lengths = []
+    winners = []
+    pos = 0
+    total = len(words)
+    while pos + 2 <= total:
+        length = int(words[pos])
+        if pos + 2 + length > total:
+            break
+        starts.append(pos + 2)
+        lengths.append(length)
+        winners.append(int(words[pos + 1]) & 0xFF)
+        pos += 2 + length
+    lengths = np.array(lengths, dtype=np.int64)
+    starts = np.array(starts, dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    game = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+    index = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+    moves = words[index]
+    return {
+        "winner": np.array(winners, dtype=np.int8),
+        "length": lengths,
+        "offsets": offsets,
+        "game": game,
+        "player": (moves >> 12).astype(np.int8),
+        "kind": ((moves >> 10) & 3).astype(np.int8),
+        "frm": ((moves >> 5) & 31).astype(np.int8),
+        "to": (moves & 31).astype(np.int8),
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python game_codec.py DATASET.json[l] GAMES.bin")
+        return 1
+    from game_log import iter_games as iter_logged_games
+    count = 0
+    with open(argv[1], "wb") as out:
+        out.write(MAGIC)
+        for game in iter_logged_games(argv[0]):
+            out.write(encode_game(game))
+            count += 1
+    print(f"encoded {count} games, {os.path.getsize(argv[0])} -> {os.path.getsize(argv[1])} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Append-only game log in JSON Lines format: one finished game per line, in the
+same {"moves": [...], "winner": ...} shape runv2.py's log_move produces.
+
+Writing a game is a single append plus fsync, so cost no longer grows with the
+size of the dataset. A crash can at worst leave one truncated line; the next
+append starts on a fresh line and the reader skips the damaged one.
+iter_games streams games one at a time and also reads the old single-list
+morabararaba_dataset.json.
+
+    python game_log.py morabararaba_dataset.json morabararaba_dataset.jsonl
+"""
+import json
+import os
+import sys
+
+from engine import MOVING, PLACING, PLAYERS, POINT_INDEX, POINT_MASKS, REMOVAL, TOTAL_PIECES, Board
+
+PHASE_OF_ACTION = {"place": PLACING, "move": MOVING, "capture": REMOVAL}
+
+
+def append_game(path, game):
+    """Append one game as a single JSON line and force it to disk."""
+    line = json.dumps(game, separators=(",", ":")) + "\n"
+    with open(path, "ab+") as f:
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = "\n" + line  # Previous append was cut short.
+        f.write(line.encode())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def iter_games(path):
+    """Yield games from a .jsonl log, a legacy JSON list file or a game_codec .bin file."""
+    if path.endswith(".bin"):
+        from game_codec import iter_games as iter_records
+        yield from iter_records(path)
+        return
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            yield from json.load(f)
+        return
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                game = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A game whose append was interrupted.
+            yield game
+
+
+def replay_game(game):
+    """
+    Yield (board, move) for each logged move with board set to the position
+    the move is played from (mover to play, phase from the move kind), then
+    (board, None) for the final position. The same engine.Board is updated in
+    place, by effect and without legality checks, mill counters or hash
+    (board.recount() rebuilds them).
+
+    Games without a "log_version" come from the old runv2 logger, which
+    recorded the player to move next instead of the mover and skipped
+    mill-forming moves. Their players are flipped back; the skipped moves
+    cannot be recovered, so those positions are only approximate.
+    """
+    legacy = game.get("log_version", 1) < 2
+    board = Board()
+    mover = 0
+    for move in game["moves"]:
+        mover = PLAYERS.index(move["player"])
+        if legacy:
+            mover = 1 - mover
+        board.current = mover
+        board.phase = PHASE_OF_ACTION[move["action"]]
+        yield board, move
+        bit = POINT_MASKS[POINT_INDEX[move["to"]]]
+        if move["action"] == "place":
+            board.pieces[mover] |= bit
+            board.placed[mover] += 1
+        elif move["action"] == "move":
+            board.pieces[mover] &= ~POINT_MASKS[POINT_INDEX[move["from"]]]
+            board.pieces[mover] |= bit
+        else:
+            board.pieces[1 - mover] &= ~bit
+            board.removed[1 - mover] += 1
+    board.current = 1 - mover
+    done_placing = board.placed[0] >= TOTAL_PIECES and board.placed[1] >= TOTAL_PIECES
+    board.phase = MOVING if done_placing else PLACING
+    yield board, None
+
+
+def convert_dataset(json_path, jsonl_path):
+    """One-shot conversion of a JSON list dataset to the append-only log. Returns the game count."""
+    count = 0
+    with open(jsonl_path, "w") as out:
+        for game in iter_games(json_path):
+            out.write(json.dumps(game, separators=(",", ":")) + "\n")
+            count += 1
+        out.flush()
+        os.fsync(out.fileno())
+    return count
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python game_log.py DATASET.json DATASET.jsonl")
+        return 1
+    count = convert_dataset(argv[0], argv[1])
+    print(f"converted {count} games from {argv[0]} to {argv[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Indexed game store on SQLite.
+
+Each ingested game is kept as a compact game_codec record together with its
+winner, first player, length and opening (the first OPENING_PLIES moves as
+text, e.g. "d2 b4 f6"). Every position the game passes through is stored as
+an engine.Board.key() (an exact 59-bit key) with its ply, so "every game
+through this position", "games X won opening on d2" and per-position win
+counts are index lookups instead of a replay of the whole corpus.
+
+    python game_store.py games.db ingest morabararaba_dataset.json games.bin
+    python game_store.py games.db opening "d2 b4" --winner X
+    python game_store.py games.db stats
+"""
+import argparse
+import sqlite3
+import sys
+
+from engine import PLAYERS, POINT_INDEX, move_to_str
+from game_codec import ACTION_KINDS, decode_game, encode_game
+from game_log import iter_games, replay_game
+
+OPENING_PLIES = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    winner TEXT,
+    first_player TEXT,
+    length INTEGER NOT NULL,
+    opening TEXT NOT NULL,
+    source TEXT,
+    record BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    hash INTEGER NOT NULL,
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    ply INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS positions_by_hash ON positions(hash);
+CREATE INDEX IF NOT EXISTS games_by_winner ON games(winner, length);
+CREATE INDEX IF NOT EXISTS games_by_length ON games(length);
+CREATE INDEX IF NOT EXISTS games_by_opening ON games(opening, winner);
+"""
+
+
+def opening_text(game, plies=OPENING_PLIES):
+    words = []
+    for move in game["moves"][:plies]:
+        frm = POINT_INDEX[move["from"]] if move["from"] else 0
+        words.append(move_to_str((ACTION_KINDS[move["action"]] << 10) | (frm << 5) | POINT_INDEX[move["to"]]))
+    return " ".join(words)
+
+
+class GameStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_game(self, game, source=None):
+        """Insert one game (log_move format) and its positions. Returns the game id."""
+        keys = []
+        first_player = None
+        for board, move in replay_game(game):
+            if first_player is None and move is not None:
+                first_player = PLAYERS[board.current]  # The mover, corrected for legacy logs.
+            keys.append(board.key())
+        cur = self.conn.execute(
+            "INSERT INTO games (winner, first_player, length, opening, source, record) VALUES (?, ?, ?, ?, ?, ?)",
+            (game["winner"], first_player, len(game["moves"]), opening_text(game), source, encode_game(game)))
+        game_id = cur.lastrowid
+        self.conn.executemany("INSERT INTO positions (hash, game_id, ply) VALUES (?, ?, ?)",
+                              [(key, game_id, ply) for ply, key in enumerate(keys)])
+        return game_id
+
+    def add_games(self, games, source=None):
+        """Insert many games in one transaction. Returns the number added."""
+        count = 0
+        with self.conn:
+            for game in games:
+                self.add_game(game, source)
+                count += 1
+        return count
+
+    def get_game(self, game_id):
+        row = self.conn.execute("SELECT record FROM games WHERE id = ?", (game_id,)).fetchone()
+        return decode_game(row[0])[0] if row else None
+
+    def games_with_position(self, key):
+        """(game_id, ply) for every visit of the position with this Board.key()."""
+        return self.conn.execute(
+            "SELECT game_id, ply FROM positions WHERE hash = ? ORDER BY game_id, ply", (key,)).fetchall()
+
+    def position_stats(self, key):
+        """Win counts ({'X': n, 'O': n, None: n}) over the games that reached this position."""
+        stats = {'X': 0, 'O': 0, None: 0}
+        rows = self.conn.execute(
+            "SELECT g.winner, COUNT(DISTINCT g.id) FROM positions p JOIN games g ON g.id = p.game_id "
+            "WHERE p.hash = ? GROUP BY g.winner", (key,))
+        for winner, count in rows:
+            stats[winner] = count
+        return stats
+
+    def games_by_opening(self, prefix, winner=None, first_player=None):
+        """Ids of games whose opening starts with prefix (e.g. "d2 b4"), optionally filtered."""
+        # A half-open range on the indexed column instead of LIKE, which SQLite
+        # cannot serve from the index by default.
+        query = "SELECT id FROM games WHERE opening >= ? AND opening < ?"
+        params = [prefix, prefix + "\uffff"]
+        if winner is not None:
+            query += " AND winner = ?"
+            params.append(winner)
+        if first_player is not None:
+            query += " AND first_player = ?"
+            params.append(first_player)
+        return [row[0] for row in self.conn.execute(query + " ORDER BY id", params)]
+
+    def games_by_length(self, min_length=0, max_length=None, winner=None):
+        query = "SELECT id FROM games WHERE length >= ?"
+        params = [min_length]
+        if max_length is not None:
+            query += " AND length <= ?"
+            params.append(max_length)
+        if winner is not None:
+            query += " AND winner = ?"
+            params.append(winner)
+        return [row[0] for row in self.conn.execute(query + " ORDER BY id", params)]
+
+    def stats(self):
+        games, positions = self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM games), (SELECT COUNT(*) FROM positions)").fetchone()
+        distinct = self.conn.execute("SELECT COUNT(DISTINCT hash) FROM positions").fetchone()[0]
+        return {"games": games, "positions": positions, "distinct_positions": distinct}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite store of Morabaraba games.")
+    parser.add_argument("db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="add games from .json, .jsonl or .bin files")
+    ingest.add_argument("files", nargs="+")
+    opening = sub.add_parser("opening", help="list games by opening prefix")
+    opening.add_argument("prefix")
+    opening.add_argument("--winner", choices=("X", "O"))
+    opening.add_argument("--first-player", choices=("X", "O"))
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    store = GameStore(args.db)
+    if args.command == "ingest":
+        for path in args.files:
+            count = store.add_games(iter_games(path), source=path)
+            print(f"{path}: {count} games")
+    elif args.command == "opening":
+        ids = store.games_by_opening(args.prefix, args.winner, args.first_player)
+        print(f"{len(ids)} games: {' '.join(map(str, ids))}")
+    else:
+        print(store.stats())
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
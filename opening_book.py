@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Opening book for the placing phase, compiled from recorded games.
+
+Every placement in the games is counted against its position, seen from the
+mover (own pieces, opponent pieces) and reduced to its canonical symmetry
+class (see symmetry.py), so X and O games and all 16 orientations of a
+position share one entry. Each (position, point) pair keeps how often it was
+played and the mover's score in half points (2 win, 1 unfinished, 0 loss).
+
+The book file is a 16-byte header and the entries as 16-byte records
+sorted by position and point, so a lookup is a binary search over a
+memory-mapped array and all replies to a position are adjacent.
+
+Games from the legacy runv2 logger miss the mill-forming moves, so only
+their placements before the first capture are used.
+
+    python opening_book.py build opening_book.bin morabararaba_dataset.json games.bin
+    python opening_book.py probe opening_book.bin "g1 c3 g7"
+"""
+import argparse
+import struct
+import sys
+
+import numpy as np
+
+from engine import NUM_POINTS, PLAYERS, POINT_INDEX, POINTS
+from game_log import iter_games
+from symmetry import NUM_SYMMETRIES, PERMS, canonical_bits, inverse_of, transform_bits
+
+MAGIC = b"MORABOOK"
+HEADER = struct.Struct("<8sQ")  # magic, entries
+RECORD = np.dtype([("entry", "<u8"), ("played", "<u4"), ("score", "<u4")])
+POINT_BITS = 5
+DEFAULT_PLIES = 24
+POINT_WEIGHTS = np.array([1 << i for i in range(NUM_POINTS)], dtype=np.int64)
+
+
+def position_key(own_bits, opp_bits):
+    """
+    (key, symmetries): the canonical mover-relative position key and every
+    symmetry that maps the position onto it (more than one if the position
+    is itself symmetric).
+    """
+    own, opp, s = canonical_bits(own_bits, opp_bits)
+    symmetries = [t for t in range(s, NUM_SYMMETRIES)
+                  if transform_bits(own_bits, t) == own and transform_bits(opp_bits, t) == opp]
+    return own | opp << NUM_POINTS, symmetries
+
+
+def canonical_point(point, symmetries):
+    # Equivalent replies in a symmetric position are counted as one.
+    return min(PERMS[t][point] for t in symmetries)
+
+
+def game_placements(game, max_plies=DEFAULT_PLIES):
+    """Yield (own_bits, opp_bits, point, score) for the placements of a recorded game."""
+    legacy = game.get("log_version", 1) < 2
+    winner = game.get("winner")
+    pieces = [0, 0]
+    for ply, move in enumerate(game["moves"]):
+        if ply >= max_plies:
+            break
+        mover = PLAYERS.index(move["player"])
+        if legacy:
+            if move["action"] != "place":
+                break
+            mover = 1 - mover  # The old logger recorded the next player.
+        point = POINT_INDEX[move["to"]]
+        if move["action"] == "place":
+            score = 1 if winner is None else 2 if winner == PLAYERS[mover] else 0
+            yield pieces[mover], pieces[1 - mover], point, score
+            pieces[mover] |= 1 << point
+        elif move["action"] == "capture":
+            pieces[1 - mover] &= ~(1 << point)
+        else:
+            break
+
+
+def build(paths, max_plies=DEFAULT_PLIES):
+    """Sorted RECORD array aggregated over every game in paths."""
+    counts = {}
+    for path in paths:
+        for game in iter_games(path):
+            for own_bits, opp_bits, point, score in game_placements(game, max_plies):
+                key, symmetries = position_key(own_bits, opp_bits)
+                entry = key << POINT_BITS | canonical_point(point, symmetries)
+                played, total = counts.get(entry, (0, 0))
+                counts[entry] = (played + 1, total + score)
+    records = np.zeros(len(counts), dtype=RECORD)
+    records["entry"] = np.fromiter(counts, dtype=np.uint64, count=len(counts))
+    values = np.array(list(counts.values()), dtype=np.uint32).reshape(-1, 2)
+    records["played"] = values[:, 0]
+    records["score"] = values[:, 1]
+    records.sort(order="entry")
+    return records
+
+
+def write_book(path, records):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        f.write(records.tobytes())
+
+
+class OpeningBook:
+    def __init__(self, path, min_games=2):
+        """Memory-map the book at path; moves need min_games plays to be chosen."""
+        with open(path, "rb") as f:
+            magic, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+        self.records = (np.memmap(path, dtype=RECORD, mode="r", offset=HEADER.size, shape=(count,))
+                        if count else np.zeros(0, dtype=RECORD))
+        self.entries = self.records["entry"]
+        self.min_games = min_games
+
+    def __len__(self):
+        return len(self.records)
+
+    def moves(self, own_bits, opp_bits):
+        """
+        [(point, played, score)] for the side to move, in this position's
+        orientation. Of equivalent points in a symmetric position only one is
+        listed.
+        """
+        key, symmetries = position_key(own_bits, opp_bits)
+        lo = np.searchsorted(self.entries, np.uint64(key << POINT_BITS))
+        hi = np.searchsorted(self.entries, np.uint64((key + 1) << POINT_BITS))
+        back = PERMS[inverse_of(symmetries[0])]
+        mask = (1 << POINT_BITS) - 1
+        return [(back[int(r["entry"]) & mask], int(r["played"]), int(r["score"]))
+                for r in self.records[lo:hi]]
+
+    def choose(self, own_bits, opp_bits):
+        """Point with the best score rate among moves played at least min_games times, or None."""
+        best = None
+        best_rank = None
+        for point, played, score in self.moves(own_bits, opp_bits):
+            if played < self.min_games:
+                continue
+            rank = (score / played, played)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = point, rank
+        return best
+
+    def choose_state(self, state):
+        """choose() for a DQN state array (1 own, -1 opponent, 0 empty over POINTS)."""
+        return self.choose(int(POINT_WEIGHTS[state == 1].sum()), int(POINT_WEIGHTS[state == -1].sum()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the placing-phase opening book.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build")
+    build_cmd.add_argument("book")
+    build_cmd.add_argument("games", nargs="+", help="game files (.json, .jsonl or game_codec .bin)")
+    build_cmd.add_argument("--plies", type=int, default=DEFAULT_PLIES, help="only use the first N moves")
+    probe = sub.add_parser("probe")
+    probe.add_argument("book")
+    probe.add_argument("line", nargs="?", default="", help='placements so far, e.g. "g1 c3 g7"')
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        records = build(args.games, args.plies)
+        write_book(args.book, records)
+        positions = len(np.unique(records["entry"] >> np.uint64(POINT_BITS)))
+        print(f"{len(records)} entries for {positions} positions from {int(records['played'].sum())} placements")
+        return 0
+    book = OpeningBook(args.book)
+    pieces = [0, 0]
+    for ply, name in enumerate(args.line.split()):
+        pieces[ply % 2] |= 1 << POINT_INDEX[name]
+    mover = len(args.line.split()) % 2
+    replies = sorted(book.moves(pieces[mover], pieces[1 - mover]), key=lambda m: -m[1])
+    for point, played, score in replies:
+        print(f"{POINTS[point]:>3} played {played:5d}  score {score / (2 * played):.3f}")
+    if not replies:
+        print("not in book")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
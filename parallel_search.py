@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Multi-core move choice for the moving and removal phases.
+
+RootParallelMCTS runs an independent MCTS per worker process on the same
+position, each with its own Dirichlet noise at the root so the trees differ,
+and merges them by summing the root visit counts.
+
+SharedTreeMCTS has all workers grow one tree held in shared memory: flat
+arrays of node statistics and children, with node statistics guarded by a
+fixed set of striped locks (node % STRIPES) and child blocks allocated from
+a shared counter. Workers replay moves from the root on their own Board and
+use virtual loss so they spread over the tree. Given a model, each worker
+sets the priors of the children it creates from the DQN like mcts.MCTS.
+
+Both keep their worker processes alive between searches. The benchmark runs
+a fixed suite of moving/removal positions replayed from the game dataset
+with 1..N workers:
+
+    python parallel_search.py --workers 8 --time 1.0
+"""
+import argparse
+import math
+import multiprocessing as mp
+import random
+import sys
+import time
+
+import numpy as np
+
+from engine import MOVING, TOTAL_PIECES, move_to_str
+from game_log import iter_games, replay_game
+from mcts import MCTS, DQNEvaluator, MCTSResult, VALUE_SCALE, encode_states, move_priors, terminal_value
+from search import evaluate
+
+STRIPES = 64
+# Node states in the shared tree.
+NEW, EXPANDING, EXPANDED, TERMINAL = 0, 1, 2, 3
+
+
+def _load_evaluator(model):
+    if model is None:
+        return None
+    import torch
+    from ai_dqn import DQN
+    net = DQN(24, 24)
+    net.load_state_dict(torch.load(model))
+    net.eval()
+    return DQNEvaluator(net)
+
+
+# ------------------------------- Root parallel -------------------------------
+
+_worker_mcts = None
+
+def _root_init(model, batch_size, noise, seed):
+    global _worker_mcts
+    import torch
+    torch.set_num_threads(1)
+    identity = mp.current_process()._identity
+    _worker_mcts = MCTS(_load_evaluator(model), batch_size=batch_size, noise=noise,
+                        seed=seed + (identity[0] if identity else 0))
+
+def _root_search(args):
+    board, simulations, time_limit = args
+    result = _worker_mcts.search(board, simulations, time_limit)
+    return result.visits, result.simulations
+
+
+class RootParallelMCTS:
+    def __init__(self, workers, model=None, batch_size=32, noise=0.25, seed=0):
+        self.workers = workers
+        ctx = mp.get_context("spawn")
+        self.pool = ctx.Pool(workers, initializer=_root_init, initargs=(model, batch_size, noise, seed))
+
+    def search(self, board, simulations=100000, time_limit=1.0):
+        """Each worker runs up to simulations in time_limit seconds; visit counts are summed."""
+        start = time.perf_counter()
+        board = board.copy()
+        results = self.pool.map(_root_search, [(board, simulations, time_limit)] * self.workers)
+        visits = {}
+        total = 0
+        for worker_visits, sims in results:
+            total += sims
+            for move, count in worker_visits.items():
+                visits[move] = visits.get(move, 0) + count
+        move = max(visits, key=visits.get) if visits else None
+        return MCTSResult(move, visits, 0.0, total, self.workers, time.perf_counter() - start)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+# -------------------------------- Shared tree --------------------------------
+
+SHARED_FIELDS = (
+    ("move", np.int32), ("player", np.int8), ("state", np.int8), ("first_child", np.int32),
+    ("num_children", np.int32), ("prior", np.float32), ("visits", np.float64),
+    ("value_sum", np.float64), ("terminal", np.float32),
+)
+
+
+def _attach(buffers):
+    return {name: np.frombuffer(buffers[name], dtype=dtype) for name, dtype in SHARED_FIELDS}
+
+
+class _TreeWorker:
+    def __init__(self, buffers, next_free, alloc_lock, locks, c_puct, virtual_loss, evaluator=None):
+        self.arrays = _attach(buffers)
+        self.evaluator = evaluator
+        self.capacity = len(self.arrays["move"])
+        self.next_free = next_free
+        self.alloc_lock = alloc_lock
+        self.locks = locks
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+
+    def select(self, node):
+        a = self.arrays
+        start = a["first_child"][node]
+        end = start + a["num_children"][node]
+        visits = a["visits"][start:end]
+        q = np.divide(a["value_sum"][start:end], visits, out=np.zeros(end - start), where=visits > 0)
+        scores = q + self.c_puct * math.sqrt(a["visits"][node] + 1) * a["prior"][start:end] / (1 + visits)
+        return start + int(scores.argmax())
+
+    def add(self, node, visits, value):
+        with self.locks[node % STRIPES]:
+            self.arrays["visits"][node] += visits
+            self.arrays["value_sum"][node] += value
+
+    def simulate(self, board):
+        """One descent, expansion and backup. Returns False on a collision with another worker."""
+        a = self.arrays
+        vl = self.virtual_loss
+        path = [0]
+        self.add(0, vl, 0.0)
+        node = 0
+        while a["state"][node] == EXPANDED:
+            node = self.select(node)
+            self.add(node, vl, -vl)
+            board.make_move(int(a["move"][node]))
+            path.append(node)
+
+        if a["state"][node] == TERMINAL:
+            side, value = int(a["player"][node]), float(a["terminal"][node])
+        else:
+            with self.locks[node % STRIPES]:
+                mine = a["state"][node] == NEW
+                if mine:
+                    a["state"][node] = EXPANDING
+            if not mine:
+                # Another worker is expanding this leaf: take the virtual loss back.
+                self.add(0, -vl, 0.0)
+                for n in path[1:]:
+                    self.add(n, -vl, vl)
+                for _ in path[1:]:
+                    board.undo_move()
+                return False
+            side, value = self.expand(board, node)
+
+        self.add(0, 1 - vl, 0.0)
+        for n in path[1:]:
+            self.add(n, 1 - vl, vl + (value if a["player"][n] == side else -value))
+        for _ in path[1:]:
+            board.undo_move()
+        return True
+
+    def expand(self, board, node):
+        a = self.arrays
+        moves = board.legal_moves()
+        value = terminal_value(board, moves)
+        if value is not None:
+            # Stored from the view of the player who moved into the node.
+            mover = int(a["player"][node])
+            a["terminal"][node] = value if board.current == mover else -value
+            a["state"][node] = TERMINAL
+            return mover, float(a["terminal"][node])
+        with self.alloc_lock:
+            start = self.next_free.value
+            if start + len(moves) <= self.capacity:
+                self.next_free.value = start + len(moves)
+        value = math.tanh(evaluate(board) / VALUE_SCALE)
+        logits = None
+        if self.evaluator is not None:
+            players = np.array([board.current])
+            logits, values = self.evaluator(encode_states([board.pieces], players), players)
+            logits = logits[0]
+            if values is not None:
+                value = float(values[0])
+        if start + len(moves) > self.capacity:
+            a["state"][node] = NEW  # Tree is full: evaluate without expanding.
+            return board.current, value
+        end = start + len(moves)
+        a["move"][start:end] = moves
+        a["player"][start:end] = board.current
+        a["state"][start:end] = NEW
+        a["prior"][start:end] = move_priors(moves, logits)
+        a["visits"][start:end] = 0.0
+        a["value_sum"][start:end] = 0.0
+        a["first_child"][node] = start
+        a["num_children"][node] = len(moves)
+        a["state"][node] = EXPANDED
+        return board.current, value
+
+
+def _tree_main(buffers, next_free, alloc_lock, locks, tasks, results, c_puct, virtual_loss, model):
+    if model is not None:
+        import torch
+        torch.set_num_threads(1)
+    worker = _TreeWorker(buffers, next_free, alloc_lock, locks, c_puct, virtual_loss, _load_evaluator(model))
+    results.put(None)  # Ready.
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        board, simulations, deadline = task
+        done = collisions = 0
+        while done < simulations and time.time() < deadline:
+            if worker.simulate(board):
+                done += 1
+            else:
+                collisions += 1
+        results.put((done, collisions))
+
+
+class SharedTreeMCTS:
+    def __init__(self, workers, capacity=1 << 20, c_puct=1.5, virtual_loss=1.0, model=None):
+        ctx = mp.get_context("spawn")
+        self.workers = workers
+        self.buffers = {name: ctx.RawArray(np.ctypeslib.as_ctypes_type(dtype), capacity)
+                        for name, dtype in SHARED_FIELDS}
+        self.arrays = _attach(self.buffers)
+        self.next_free = ctx.RawValue('i', 1)
+        # Held on self: the children rebuild the locks after start() returns.
+        self.alloc_lock = ctx.Lock()
+        self.locks = [ctx.Lock() for _ in range(STRIPES)]
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.processes = [ctx.Process(target=_tree_main, daemon=True,
+                                      args=(self.buffers, self.next_free, self.alloc_lock, self.locks,
+                                            self.tasks, self.results, c_puct, virtual_loss, model))
+                          for _ in range(workers)]
+        for process in self.processes:
+            process.start()
+        for _ in self.processes:
+            self.results.get()
+        self.collisions = 0
+
+    def search(self, board, simulations=100000, time_limit=1.0):
+        """All workers grow one tree for time_limit seconds; simulations is shared between them."""
+        start = time.perf_counter()
+        a = self.arrays
+        a["state"][0] = NEW
+        a["player"][0] = 1 - board.current
+        a["visits"][0] = 0.0
+        a["value_sum"][0] = 0.0
+        self.next_free.value = 1
+        board = board.copy()
+        deadline = time.time() + time_limit
+        share = -(-simulations // self.workers)
+        for _ in self.processes:
+            self.tasks.put((board, share, deadline))
+        total = 0
+        self.collisions = 0
+        for _ in self.processes:
+            done, collisions = self.results.get()
+            total += done
+            self.collisions += collisions
+        elapsed = time.perf_counter() - start
+        if a["state"][0] != EXPANDED:
+            return MCTSResult(None, {}, 0.0, total, 1, elapsed)
+        first = a["first_child"][0]
+        children = range(first, first + a["num_children"][0])
+        visits = {int(a["move"][c]): int(a["visits"][c]) for c in children}
+        best = max(children, key=lambda c: a["visits"][c])
+        value = a["value_sum"][best] / a["visits"][best] if a["visits"][best] else 0.0
+        return MCTSResult(int(a["move"][best]), visits, float(value), total, 1, elapsed)
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join()
+
+
+# --------------------------------- Benchmark ---------------------------------
+
+def benchmark_positions(path="morabararaba_dataset.json", count=16, seed=0):
+    """A fixed sample of moving and removal positions, after placing, replayed from a game file."""
+    positions = []
+    for game in iter_games(path):
+        placing_done = False
+        for board, move in replay_game(game):
+            if move is None:
+                break
+            placing_done = placing_done or board.phase == MOVING
+            if placing_done:
+                snapshot = board.copy()
+                # Legacy logs miss the mill-forming placements, so the counts
+                # fall short of the moving phase the game was actually in.
+                snapshot.placed = [TOTAL_PIECES, TOTAL_PIECES]
+                snapshot.recount()
+                if snapshot.winner() is None and snapshot.legal_moves():
+                    positions.append(snapshot)
+    random.Random(seed).shuffle(positions)
+    return positions[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scaling benchmark for parallel MCTS move choice.")
+    parser.add_argument("--dataset", default="morabararaba_dataset.json")
+    parser.add_argument("--positions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=mp.cpu_count(), help="largest worker count to try")
+    parser.add_argument("--time", type=float, default=1.0, help="seconds per position")
+    parser.add_argument("--mode", choices=("root", "tree", "both"), default="both")
+    parser.add_argument("--model", default=None, help="DQN weights for the priors (default: uniform)")
+    args = parser.parse_args(argv)
+
+    positions = benchmark_positions(args.dataset, args.positions)
+    print(f"{len(positions)} positions, {args.time}s each")
+    counts = sorted({1, args.workers} | {2 ** k for k in range(1, 8) if 2 ** k < args.workers})
+    modes = ("root", "tree") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        base = None
+        for workers in counts:
+            if mode == "root":
+                searcher = RootParallelMCTS(workers, args.model)
+            else:
+                searcher = SharedTreeMCTS(workers, model=args.model)
+            searcher.search(positions[0], 100, 0.05)  # Warm up the workers.
+            sims = 0
+            elapsed = 0.0
+            moves = []
+            for board in positions:
+                result = searcher.search(board, 10 ** 9, args.time)
+                sims += result.simulations
+                elapsed += result.elapsed
+                moves.append(move_to_str(result.move) if result.move is not None else "-")
+            searcher.close()
+            rate = sims / elapsed
+            base = base or rate
+            print(f"{mode:>4} {workers:>3} workers: {rate:9.0f} sims/s  x{rate / base:5.2f}  {' '.join(moves)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Replay buffer stored in fixed-width numpy.memmap files.
+
+A store is a directory with one raw file per field (states, actions,
+rewards, next_states, dones) and a small int64 header holding the capacity,
+state size, write position and count. Opening a store only maps the files,
+so it is instant whatever the size. Capacity is limited by disk, not RAM,
+since only the pages a batch touches get read. Each push marks its slot
+as being written in the header, writes it, bumps the write position and
+count and then clears the mark. A slot left marked by a crash mid-write (or
+still being written, for a reader) is never sampled; the next push goes to
+the same slot and rewrites it whole, so a crash loses at most that
+transition.
+
+Several learner processes can open the same store with readonly=True and
+call refresh() to pick up transitions appended by the writer.
+
+    python replay_store.py buffer_x.pkl replay/x    # import a pickled buffer
+"""
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from ai_dqn import ReplayBuffer
+
+MAGIC = 0x4D4F5241  # "MORA"
+VERSION = 1
+# Header fields, as int64. H_WRITING is the slot being written plus one, 0 if none.
+H_MAGIC, H_VERSION, H_CAPACITY, H_STATE_SIZE, H_POSITION, H_SIZE, H_WRITING = range(7)
+HEADER_LEN = 8
+
+FIELDS = (
+    ("states", np.int8, True),
+    ("actions", np.int16, False),
+    ("rewards", np.float32, False),
+    ("next_states", np.int8, True),
+    ("dones", np.bool_, False),
+)
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    def __init__(self, directory, capacity=None, state_size=24, readonly=False):
+        self.directory = directory
+        self.readonly = readonly
+        header_path = os.path.join(directory, "header.bin")
+        if os.path.exists(header_path):
+            self.header = np.memmap(header_path, dtype=np.int64, mode="r" if readonly else "r+",
+                                    shape=(HEADER_LEN,))
+            if self.header[H_MAGIC] != MAGIC or self.header[H_VERSION] != VERSION:
+                raise ValueError(f"{directory} is not a replay store")
+            if capacity is not None and capacity != self.header[H_CAPACITY]:
+                raise ValueError(f"{directory} has capacity {int(self.header[H_CAPACITY])}, not {capacity}")
+            mode = "r" if readonly else "r+"
+        else:
+            if readonly or capacity is None:
+                raise FileNotFoundError(f"no replay store in {directory}")
+            os.makedirs(directory, exist_ok=True)
+            mode = "w+"
+        capacity = capacity if mode == "w+" else int(self.header[H_CAPACITY])
+        state_size = state_size if mode == "w+" else int(self.header[H_STATE_SIZE])
+
+        for name, dtype, per_point in FIELDS:
+            shape = (capacity, state_size) if per_point else (capacity,)
+            setattr(self, name, np.memmap(os.path.join(directory, name + ".bin"),
+                                          dtype=dtype, mode=mode, shape=shape))
+        if mode == "w+":
+            # The header is written last so a half-created store is never mistaken for a valid one.
+            self.header = np.memmap(header_path, dtype=np.int64, mode="w+", shape=(HEADER_LEN,))
+            self.header[:] = (MAGIC, VERSION, capacity, state_size, 0, 0, 0, 0)
+            self.header.flush()
+
+        self.capacity = capacity
+        self.rng = np.random.default_rng()
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the write position and count, e.g. in a reader following a live writer."""
+        self.position = int(self.header[H_POSITION])
+        self.size = int(self.header[H_SIZE])
+        self.torn = int(self.header[H_WRITING]) - 1
+
+    def push(self, state, action, reward, next_state, done):
+        if self.readonly:
+            raise ValueError("replay store opened read-only")
+        self.header[H_WRITING] = self.position + 1
+        super().push(state, action, reward, next_state, done)
+        self.header[H_POSITION] = self.position
+        self.header[H_SIZE] = self.size
+        self.header[H_WRITING] = 0
+        self.torn = -1
+
+    def sample_indices(self, batch_size):
+        torn = self.torn
+        if not 0 <= torn < self.size:
+            return super().sample_indices(batch_size)
+        # Draw from the other size - 1 slots.
+        indices = self.rng.choice(self.size - 1, batch_size, replace=batch_size > self.size - 1)
+        return indices + (indices >= torn)
+
+    def gather(self, indices):
+        # Sorted reads touch the mapped pages in file order.
+        return super().gather(np.sort(indices))
+
+    def flush(self):
+        if self.readonly:
+            return
+        for name, _, _ in FIELDS:
+            getattr(self, name).flush()
+        self.header.flush()
+
+    def __getstate__(self):
+        # Pickling a store (e.g. handing it to a worker) reopens the same files instead of copying them.
+        return {"directory": self.directory, "readonly": self.readonly}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"], readonly=state["readonly"])
+
+    @classmethod
+    def from_buffer(cls, buffer, directory, capacity=None):
+        """Copy an in-memory ReplayBuffer into a new store, oldest transition first."""
+        store = cls(directory, capacity or buffer.capacity, buffer.states.shape[1])
+        start = buffer.position if buffer.size == buffer.capacity else 0
+        for k in range(buffer.size):
+            i = (start + k) % buffer.capacity
+            store.push(buffer.states[i], buffer.actions[i], buffer.rewards[i],
+                       buffer.next_states[i], buffer.dones[i])
+        store.flush()
+        return store
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (2, 3):
+        print("usage: python replay_store.py BUFFER.pkl STORE_DIR [CAPACITY]")
+        return 1
+    with open(argv[0], "rb") as f:
+        buffer = pickle.load(f)
+    if hasattr(buffer, "buffer"):  # Pickled by the old list-based ReplayBuffer.
+        buffer = ReplayBuffer.from_legacy(buffer)
+    capacity = int(argv[2]) if len(argv) == 3 else None
+    store = MemmapReplayBuffer.from_buffer(buffer, argv[1], capacity)
+    print(f"wrote {len(store)} transitions to {argv[1]} (capacity {store.capacity})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
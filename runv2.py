@@ -2,16 +2,19 @@
 import pygame, sys, random
 from ai_dqn import DeepQAgent  # Import the Deep Q-learning agent
 import os
-import json
+from game_log import append_game, convert_dataset
 
-DATASET_FILE = "morabararaba_dataset.json"
+DATASET_FILE = "morabararaba_dataset.jsonl"
+LEGACY_DATASET_FILE = "morabararaba_dataset.json"
 
-# Load the dataset if it exists, otherwise create an empty one.
-if os.path.exists(DATASET_FILE):
-    with open(DATASET_FILE, "r") as f:
-        all_games = json.load(f)
-else:
-    all_games = []
+# Games are appended to a JSON Lines log; carry over the old single-list
+# dataset the first time.
+if not os.path.exists(DATASET_FILE) and os.path.exists(LEGACY_DATASET_FILE):
+    convert_dataset(LEGACY_DATASET_FILE, DATASET_FILE)
+
+# Games without "log_version" were logged with the player to move next and
+# without mill-forming moves; version 2 logs every move with its mover.
+LOG_VERSION = 2
 
 current_game_moves = []
 turn_counter = 1
@@ -264,6 +267,7 @@ def place_piece(pos):
     if board_state[pos] is None:
         board_state[pos] = current_player
         pieces_placed[current_player] += 1
+        log_move(current_player, "place", None, pos, None)
         if is_mill_formed(pos, current_player):
             info_message = f"Player {current_player} formed a mill! Remove opponent piece."
             phase = "removal"
@@ -271,7 +275,6 @@ def place_piece(pos):
         else:
             info_message = ""
             switch_player()
-            log_move(current_player, "place", None, pos, None)
             if pieces_placed['X'] == TOTAL_PIECES and pieces_placed['O'] == TOTAL_PIECES:
                 phase = "moving"
     draw_board()
@@ -286,6 +289,7 @@ def move_piece(from_pos, to_pos):
                 return
         board_state[from_pos] = None
         board_state[to_pos] = current_player
+        log_move(current_player, "move", from_pos, to_pos, None)
         if is_mill_formed(to_pos, current_player):
             info_message = f"Player {current_player} formed a mill! Remove opponent piece."
             phase = "removal"
@@ -293,7 +297,6 @@ def move_piece(from_pos, to_pos):
         else:
             info_message = ""
             switch_player()
-            log_move(current_player, "move", from_pos, to_pos, None)        
     draw_board()
 
 def remove_piece(pos):
@@ -308,8 +311,8 @@ def remove_piece(pos):
             phase = "moving"
         else:
             phase = "placing"
-        switch_player()
         log_move(current_player, "capture", None, pos, pos)
+        switch_player()
     else:
         info_message = "Cannot remove that piece!"
 
@@ -498,17 +501,14 @@ while running:
                 game_over = True
                 draw_board()
 
-                # Record game result and save to dataset.
+                # Record game result and append it to the dataset.
                 winner = win_player # already defined
-                all_games.append({
+                append_game(DATASET_FILE, {
                     "moves": current_game_moves,
-                    "winner": winner
+                    "winner": winner,
+                    "log_version": LOG_VERSION
                 })
 
-                # Save the dataset to a JSON file.
-                with open(DATASET_FILE, "w") as f:
-                    json.dump(all_games, f, indent=2)
-
                 # Reset turn counter and moves for the next game
                 turn_counter = 1
                 current_game_moves.clear()
@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
-import pygame, sys, random
+import os, pygame, sys, random, threading, time
 from ai_dqn import DeepQAgent  # Import the Deep Q-learning agent
+from engine import (MOVE, PLACE, PLAYERS, POINT_INDEX, POINT_MASKS, POINTS, Board, forms_mill,
+                    removable_mask)
+from opening_book import OpeningBook
+from search import Searcher
+from tablebase import Tablebase
+from ttable import TranspositionTable
 
 # Initialize pygame and set up the window.
 pygame.init()
@@ -33,7 +39,8 @@ exit_button_rect = None
 # Win counters for each player.
 win_counts = {'X': 0, 'O': 0}
 
-# Auto-pause feature flag (NEW)
+# Auto-pause feature flag (NEW): pause after every move at normal speed.
+# A toggles it; it is skipped above x1 and in turbo (see pausing_after_moves).
 auto_pause = True
 
 def update_layout():
@@ -44,7 +51,7 @@ def update_layout():
     board_offset_y = max((current_height - BOARD_HEIGHT) // 2, 0)
     info_x = board_offset_x + BOARD_WIDTH + INFO_MARGIN
 
-# Board positions, mills, connections, and adjacent spots.
+# Board positions, connections, and adjacent spots (the mills come from engine.MILLS).
 positions = {
     "a1": (39, 511), "a4": (39, 275), "a7": (39, 39),
     "b2": (118, 432), "b4": (118, 275), "b6": (118, 118),
@@ -56,24 +63,7 @@ positions = {
     "g1": (511, 511), "g4": (511, 275), "g7": (511, 39)
 }
 
-mills = [
-    ["a1", "a4", "a7"],
-    ["b2", "b4", "b6"],
-    ["c3", "c4", "c5"],
-    ["d1", "d2", "d3"],
-    ["d5", "d6", "d7"],
-    ["e3", "e4", "e5"],
-    ["f2", "f4", "f6"],
-    ["g1", "g4", "g7"],
-    ["a1", "d1", "g1"],
-    ["a4", "b4", "c4"],
-    ["a7", "d7", "g7"],
-    ["b2", "d2", "f2"],
-    ["b6", "d6", "f6"],
-    ["c3", "d3", "e3"],
-    ["c5", "d5", "e5"],
-    ["e4", "f4", "g4"]
-]
+pos_list = sorted(positions.keys())  # Point order of the DQN state and Q-values.
 
 connections = [
     ("a1", "a4"), ("a4", "a7"), ("a1", "d1"), ("a7", "d7"),
@@ -120,6 +110,10 @@ adjacent = {
 
 # Game state variables.
 board_state = {key: None for key in positions}
+# The same pieces on an engine Board, whose bitboards and mill counters
+# answer the mill, removal and reward questions. set_point() keeps it in
+# step with board_state.
+mill_board = Board()
 current_player = random.choice(['X', 'O'])
 pieces_placed = {'X': 0, 'O': 0}
 TOTAL_PIECES = 12
@@ -133,132 +127,223 @@ game_over = False
 paused = False
 
 
-def draw_info():
+# ------------------ Rendering ------------------
+# The game state is changed under game_lock (by the AI worker thread or the
+# event handlers), and every change ends with draw_board(), which publishes a
+# snapshot of what is on screen. The main loop paints only from the latest
+# snapshot, so it never waits for a move or a training step.
+#
+# The empty board (background, lines and point rings) is drawn once into
+# static_board and only rebuilt when the window is resized or exposed.
+# render_board remembers what it last drew at every point and info line,
+# repaints only the ones that changed over their patch of static_board and
+# hands just those rectangles to pygame.display.update.
+game_lock = threading.RLock()
+snapshot = None
+static_board = None
+drawn_points = {}   # pos -> (piece, selected, heat) last drawn there.
+drawn_info = {}     # info line -> (text, color) last drawn there.
+text_cache = {}
+TEXT_CACHE_SIZE = 256
+POINT_CELL = (-12, -12, 54, 24)  # Piece, selection ring and heatmap label around a point.
+INFO_LINE_HEIGHT = 30
+BUTTONS_LINE = 7                 # Restart and Exit take three info lines from here.
+SPEED_LINE = 10
+redraw_pending = False
+
+def render_text(text, color=BLACK):
+    # Info strings repeat from move to move, so each is rendered once.
+    key = (text, color)
+    surface = text_cache.get(key)
+    if surface is None:
+        if len(text_cache) >= TEXT_CACHE_SIZE:
+            text_cache.clear()
+        surface = text_cache[key] = font.render(text, True, color)
+    return surface
+
+def invalidate_board():
+    global static_board
+    static_board = None
+
+def build_static_board():
+    global static_board
+    static_board = pygame.Surface(screen.get_size())
+    static_board.fill(WHITE)
+    for start, end in connections:
+        start_pos = (positions[start][0] + board_offset_x, positions[start][1] + board_offset_y)
+        end_pos = (positions[end][0] + board_offset_x, positions[end][1] + board_offset_y)
+        pygame.draw.line(static_board, BLACK, start_pos, end_pos, 3)
+    for coord in positions.values():
+        pygame.draw.circle(static_board, BLACK, (coord[0] + board_offset_x, coord[1] + board_offset_y), 8, 2)
+    drawn_points.clear()
+    drawn_info.clear()
+
+def info_lines(view):
+    player = view["current_player"]
+    lines = [
+        (f"Turn: Player {player} ({'Red' if player=='X' else 'Blue'})", BLACK),
+        (f"Active: Red {view['active']['X']} Blue {view['active']['O']}", BLACK),
+        (f"Removed: Red {view['removed']['X']} Blue {view['removed']['O']}", BLACK),
+        (f"Wins: Red {view['wins']['X']} Blue {view['wins']['O']}", BLACK),
+        (view["info_message"], BLACK),
+        # If game is paused, display pause message
+        ("Paused - Press Space to Resume", RED) if view["paused"] else None,
+        ("Game Over!", BLACK) if view["game_over"] else None,
+    ]
+    return lines
+
+def draw_info(view):
+    """Repaint the info lines whose text changed. Returns the dirty rectangles."""
     global restart_button_rect, exit_button_rect
-    turn_text = f"Turn: Player {current_player} ({'Red' if current_player=='X' else 'Blue'})"
-    turn_render = font.render(turn_text, True, BLACK)
-    screen.blit(turn_render, (info_x, board_offset_y))
-    
-    red_active = count_pieces('X')
-    blue_active = count_pieces('O')
-    count_text = f"Active: Red {red_active} Blue {blue_active}"
-    count_render = font.render(count_text, True, BLACK)
-    screen.blit(count_render, (info_x, board_offset_y + 30))
-    
-    removed_text = f"Removed: Red {removed_count['X']} Blue {removed_count['O']}"
-    removed_render = font.render(removed_text, True, BLACK)
-    screen.blit(removed_render, (info_x, board_offset_y + 60))
-    
-    wins_text = f"Wins: Red {win_counts['X']} Blue {win_counts['O']}"
-    wins_render = font.render(wins_text, True, BLACK)
-    screen.blit(wins_render, (info_x, board_offset_y + 90))
-    
-    message_render = font.render(info_message, True, BLACK)
-    screen.blit(message_render, (info_x, board_offset_y + 120))
-    
-    # If game is paused, display pause message
-    if paused:
-        pause_render = font.render("Paused - Press Space to Resume", True, RED)
-        screen.blit(pause_render, (info_x, board_offset_y + 150))
-    
-    if game_over:
-        over_text = "Game Over!"
-        over_render = font.render(over_text, True, BLACK)
-        screen.blit(over_render, (info_x, board_offset_y + 180))
-        restart_button_rect = pygame.Rect(info_x, board_offset_y + 210, 100, 40)
-        pygame.draw.rect(screen, GREEN, restart_button_rect)
-        restart_text = font.render("Restart", True, BLACK)
-        screen.blit(restart_text, (info_x + 10, board_offset_y + 220))
-        exit_button_rect = pygame.Rect(info_x, board_offset_y + 260, 100, 40)
-        pygame.draw.rect(screen, RED, exit_button_rect)
-        exit_text = font.render("Exit", True, BLACK)
-        screen.blit(exit_text, (info_x + 25, board_offset_y + 270))
-
-
-
-def draw_heatmap(agent):
-    q_values = agent.get_q_values(board_state, positions)
-    pos_list = sorted(positions.keys())
-    max_q = max(q_values)
-    min_q = min(q_values)
-
-    for i, pos in enumerate(pos_list):
-        if board_state[pos] is not None:
+    width = screen.get_width() - info_x
+    dirty = []
+    slots = list(enumerate(info_lines(view))) + [(BUTTONS_LINE, view["game_over"]), (SPEED_LINE, view["speed"])]
+    for i, line in slots:
+        if drawn_info.get(i, ()) == line:
             continue
-        norm = (q_values[i] - min_q) / (max_q - min_q + 1e-6)
+        drawn_info[i] = line
+        top = board_offset_y + i * INFO_LINE_HEIGHT
+        if i == BUTTONS_LINE:
+            rect = pygame.Rect(info_x, top, width, 3 * INFO_LINE_HEIGHT)
+        else:
+            rect = pygame.Rect(info_x, top, width, INFO_LINE_HEIGHT)
+        screen.blit(static_board, rect, rect)
+        dirty.append(rect)
+        if i != BUTTONS_LINE:
+            if line is not None:
+                screen.blit(render_text(*line), rect.topleft)
+        elif line:
+            restart_button_rect = pygame.Rect(info_x, top, 100, 40)
+            pygame.draw.rect(screen, GREEN, restart_button_rect)
+            screen.blit(render_text("Restart"), (info_x + 10, top + 10))
+            exit_button_rect = pygame.Rect(info_x, top + 50, 100, 40)
+            pygame.draw.rect(screen, RED, exit_button_rect)
+            screen.blit(render_text("Exit"), (info_x + 25, top + 60))
+    return dirty
+
+
+# Heatmap: pre-built green and red sprites per displayed value (blitted one
+# after the other, as the layers were drawn before), with its label, and the
+# last heat values per agent, reused until the board or that agent's weights
+# change.
+HEAT_LEVELS = 101  # Values are shown to two decimals.
+heat_sprites = []
+heat_cache = {}    # player -> (board, model version, heat)
+
+def build_heat_sprites():
+    for level in range(HEAT_LEVELS):
+        norm = level / (HEAT_LEVELS - 1)
         intensity = int(255 * norm)
-        heat_color = (0, 255, 0, intensity)  # green with alpha
-
-        surface = pygame.Surface((20, 20), pygame.SRCALPHA)
-        pygame.draw.circle(surface, heat_color, (10, 10), 10)
-        coord = positions[pos]
-        screen.blit(surface, (coord[0] + board_offset_x - 10, coord[1] + board_offset_y - 10))
-
-        prob_text = font.render(f"{norm:.2f}", True, BLACK)
-        screen.blit(prob_text, (coord[0] + board_offset_x + 10, coord[1] + board_offset_y - 10))
-    pos_list = sorted(positions.keys())
+        layers = []
+        for heat_color in ((0, 255, 0, intensity), (255, 0, 0, intensity)):  # green, then red, with alpha
+            layer = pygame.Surface((20, 20), pygame.SRCALPHA)
+            pygame.draw.circle(layer, heat_color, (10, 10), 10)
+            layers.append(layer)
+        heat_sprites.append((layers, font.render(f"{norm:.2f}", True, BLACK)))
+
+def heatmap_values(agent):
+    """{pos: heat level} for the empty points, from the agent's normalised Q-values."""
+    board = tuple(board_state[pos] for pos in pos_list)
+    cached = heat_cache.get(agent.player)
+    if cached is not None and cached[0] == board and cached[1] == agent.model_version:
+        return cached[2]
+    q_values = agent.get_q_values(board_state, positions)
     max_q = max(q_values)
     min_q = min(q_values)
-
+    heat = {}
     for i, pos in enumerate(pos_list):
-        if board_state[pos] is not None:
-            continue
-        norm = (q_values[i] - min_q) / (max_q - min_q + 1e-6)
-        intensity = int(255 * norm)
-        heat_color = (255, 0, 0, intensity)  # red with alpha
-
-        surface = pygame.Surface((20, 20), pygame.SRCALPHA)
-        pygame.draw.circle(surface, heat_color, (10, 10), 10)
-        coord = positions[pos]
-        screen.blit(surface, (coord[0] + board_offset_x - 10, coord[1] + board_offset_y - 10))
+        if board_state[pos] is None:
+            norm = (q_values[i] - min_q) / (max_q - min_q + 1e-6)
+            heat[pos] = int(round(float(norm) * (HEAT_LEVELS - 1)))
+    heat_cache[agent.player] = (board, agent.model_version, heat)
+    return heat
+
+def draw_heat(coord, level):
+    layers, label = heat_sprites[level]
+    for layer in layers:
+        screen.blit(layer, (coord[0] - 10, coord[1] - 10))
+    screen.blit(label, (coord[0] + 10, coord[1] - 10))
+
+build_heat_sprites()
+
+def point_rect(pos):
+    dx, dy, w, h = POINT_CELL
+    return pygame.Rect(positions[pos][0] + board_offset_x + dx, positions[pos][1] + board_offset_y + dy, w, h)
+
+def draw_point(pos, piece, selected, heat):
+    rect = point_rect(pos)
+    screen.blit(static_board, rect, rect)
+    pos_coord = (positions[pos][0] + board_offset_x, positions[pos][1] + board_offset_y)
+    if selected:
+        pygame.draw.circle(screen, GREEN, pos_coord, 12, 3)
+    if piece:
+        color = RED if piece == 'X' else BLUE
+        pygame.draw.circle(screen, color, pos_coord, 6)
+    if heat is not None:
+        draw_heat(pos_coord, heat)
+    return rect
 
 def draw_board():
-    update_layout()
-    screen.fill(WHITE)
-    # Draw board lines.
-    for start, end in connections:
-        start_pos = (positions[start][0] + board_offset_x, positions[start][1] + board_offset_y)
-        end_pos = (positions[end][0] + board_offset_x, positions[end][1] + board_offset_y)
-        pygame.draw.line(screen, BLACK, start_pos, end_pos, 3)
-    
-    # Draw board positions and any placed pieces.
-    for pos, coord in positions.items():
-        pos_coord = (coord[0] + board_offset_x, coord[1] + board_offset_y)
-        pygame.draw.circle(screen, BLACK, pos_coord, 8, 2)
-        if phase == "moving" and selected_piece == pos:
-            pygame.draw.circle(screen, GREEN, pos_coord, 12, 3)
-        if board_state[pos]:
-            color = RED if board_state[pos]=='X' else BLUE
-            pygame.draw.circle(screen, color, pos_coord, 6)
-    
-    draw_info()
-
+    """Publish the current game state to the render loop. Call with game_lock held."""
+    global snapshot, redraw_pending
     # 🔥 Draw heatmap if AI is active
+    heat = {}
     if AI_MODE:
         agent = deep_agent_x if current_player == 'X' else deep_agent_o
-        draw_heatmap(agent)
-
-    pygame.display.flip()
+        heat = heatmap_values(agent)
+    snapshot = {
+        "board": dict(board_state),
+        "selected": selected_piece if phase == "moving" else None,
+        "current_player": current_player,
+        "active": {'X': count_pieces('X'), 'O': count_pieces('O')},
+        "removed": dict(removed_count),
+        "wins": dict(win_counts),
+        "info_message": info_message,
+        "paused": paused,
+        "game_over": game_over,
+        "heat": heat,
+        "speed": speed_line(),
+    }
+    redraw_pending = True
+
+def render_board(view):
+    update_layout()
+    full = static_board is None or static_board.get_size() != screen.get_size()
+    if full:
+        build_static_board()
+        screen.blit(static_board, (0, 0))
+
+    dirty = []
+    heat = view["heat"]
+    for pos, piece in view["board"].items():
+        look = (piece, view["selected"] == pos, heat.get(pos))
+        if drawn_points.get(pos) != look:
+            drawn_points[pos] = look
+            dirty.append(draw_point(pos, *look))
+    dirty.extend(draw_info(view))
+
+    if full:
+        pygame.display.flip()
+    elif dirty:
+        pygame.display.update(dirty)
 
 def is_mill_formed(pos, player):
-    for mill in mills:
-        if pos in mill:
-            if all(board_state[p] == player for p in mill):
-                return True
-    return False
+    return forms_mill(mill_board.pieces[PLAYERS.index(player)], POINT_INDEX[pos])
+
+def set_point(pos, value):
+    board_state[pos] = value
+    mill_board.set_point(POINT_INDEX[pos], PLAYERS.index(value) if value is not None else None)
 
 def can_remove(pos, opponent):
     if board_state[pos] != opponent:
         return False
-    opponent_positions = [p for p in board_state if board_state[p] == opponent]
-    if any(not is_mill_formed(p, opponent) for p in opponent_positions):
-        return not is_mill_formed(pos, opponent)
-    return True
+    # A piece in a mill can only be taken once every opponent piece is in a mill.
+    return bool(removable_mask(mill_board.pieces[PLAYERS.index(opponent)]) & POINT_MASKS[POINT_INDEX[pos]])
 
 def place_piece(pos):
     global paused, current_player, phase, removal_mode, info_message
     if board_state[pos] is None:
-        board_state[pos] = current_player
+        set_point(pos, current_player)
         pieces_placed[current_player] += 1
         if is_mill_formed(pos, current_player):
             info_message = f"Player {current_player} formed a mill! Remove opponent piece."
@@ -271,7 +356,7 @@ def place_piece(pos):
                 phase = "moving"
         
         # Automatically pause after each move if auto_pause is enabled
-        if auto_pause:
+        if pausing_after_moves():
             paused = True
             info_message += " (Game paused - Press Space to continue)"
     
@@ -285,8 +370,8 @@ def move_piece(from_pos, to_pos):
                 info_message = "Invalid move: destination not adjacent!"
                 draw_board()
                 return
-        board_state[from_pos] = None
-        board_state[to_pos] = current_player
+        set_point(from_pos, None)
+        set_point(to_pos, current_player)
         if is_mill_formed(to_pos, current_player):
             info_message = f"Player {current_player} formed a mill! Remove opponent piece."
             phase = "removal"
@@ -296,7 +381,7 @@ def move_piece(from_pos, to_pos):
             switch_player()
         
         # Automatically pause after each move if auto_pause is enabled
-        if auto_pause:
+        if pausing_after_moves():
             paused = True
             info_message += " (Game paused - Press Space to continue)"
     
@@ -306,7 +391,7 @@ def remove_piece(pos):
     global paused, current_player, phase, removal_mode, info_message, removed_count
     opponent = 'O' if current_player == 'X' else 'X'
     if can_remove(pos, opponent):
-        board_state[pos] = None
+        set_point(pos, None)
         removed_count[opponent] += 1
         info_message = f"Player {current_player} removed opponent's piece at {pos}."
         removal_mode = False
@@ -317,7 +402,7 @@ def remove_piece(pos):
         switch_player()
         
         # Automatically pause after each move if auto_pause is enabled
-        if auto_pause:
+        if pausing_after_moves():
             paused = True
             info_message += " (Game paused - Press Space to continue)"
     else:
@@ -336,8 +421,9 @@ def are_adjacent(pos1, pos2):
     return pos2 in adjacent.get(pos1, [])
 
 def reset_game():
-    global board_state, current_player, pieces_placed, removed_count, phase, removal_mode, selected_piece, selected_from, info_message, game_over
+    global board_state, mill_board, current_player, pieces_placed, removed_count, phase, removal_mode, selected_piece, selected_from, info_message, game_over
     board_state = {key: None for key in positions}
+    mill_board = Board()
     current_player = random.choice(['X', 'O'])
     pieces_placed = {'X': 0, 'O': 0}
     removed_count = {'X': 0, 'O': 0}
@@ -359,30 +445,15 @@ def calculate_mill_setup_reward(player):
     """
     Checks the current board configuration for each mill possibility.
     If there is a mill where the player has exactly two pieces and one empty spot,
-    return a bonus reward.
+    return a bonus reward. Read straight from mill_board's counters rather than rescanning mills.
     """
-    bonus = 0.0
-    for mill in mills:
-        player_count = sum(1 for pos in mill if board_state[pos] == player)
-        empty_count = sum(1 for pos in mill if board_state[pos] is None)
-        
-        # Higher reward for setups with 2 pieces and 1 empty
-        if player_count == 2 and empty_count == 1:
-            bonus += 2.0
-        # Smaller reward for setups with 1 piece and 2 empty
-        elif player_count == 1 and empty_count == 2:
-            bonus += 0.5
-    return bonus
+    # Higher reward for setups with 2 pieces and 1 empty,
+    # smaller reward for setups with 1 piece and 2 empty.
+    return mill_board.mill_setup_reward(PLAYERS.index(player))
 
 def calculate_block_opponent_reward(player):
-    opponent = 'O' if player == 'X' else 'X'
-    reward = 0.0
-    for mill in mills:
-        opponent_count = sum(1 for pos in mill if board_state[pos] == opponent)
-        empty_count = sum(1 for pos in mill if board_state[pos] is None)
-        if opponent_count == 2 and empty_count == 1:
-            reward += 1.5  # Increased reward for blocking a potential mill
-    return reward
+    # Increased reward for blocking a potential mill (opponent has 2 and 1 empty).
+    return mill_board.block_opponent_reward(PLAYERS.index(player))
 
 # ------------------ Deep Q-Learning AI Integration ------------------
 AI_MODE = True  # Enable AI self-play
@@ -391,12 +462,69 @@ AI_MODE = True  # Enable AI self-play
 deep_agent_x = DeepQAgent('X')
 deep_agent_o = DeepQAgent('O')
 
+# Q-values per position and weights version, shared by move choice and the
+# heatmap, which both evaluate the board the agent is about to play on.
+Q_CACHE_MB = 1
+deep_agent_x.q_cache = TranspositionTable(Q_CACHE_MB, q_size=24)
+deep_agent_o.q_cache = TranspositionTable(Q_CACHE_MB, q_size=24)
+
+# Opening book written by "python opening_book.py build"; the agents play its
+# moves in book positions instead of querying the network.
+OPENING_BOOK = "opening_book.bin"
+if os.path.exists(OPENING_BOOK):
+    deep_agent_x.book = deep_agent_o.book = OpeningBook(OPENING_BOOK)
+
+# Players moved by the alpha-beta searcher in every phase instead of the
+# DQN/random policy, e.g. ('O',) to play the DQN against search.
+SEARCH_PLAYERS = ()
+SEARCH_TIME = 0.2  # Seconds per searched move.
+searcher = Searcher()
+
+# Endgame tablebase written by "python tablebase.py build"; when present it
+# plays every covered moving/removal position perfectly for both players.
+TABLEBASE_DIR = "tablebase"
+tablebase = Tablebase(TABLEBASE_DIR) if os.path.isdir(TABLEBASE_DIR) else None
+
+def current_engine_board():
+    return Board.from_dict(board_state, current_player, pieces_placed, phase, removed_count)
+
+def play_engine_move(move):
+    kind, frm, to = move >> 10, POINTS[(move >> 5) & 31], POINTS[move & 31]
+    if kind == PLACE:
+        place_piece(to)
+    elif kind == MOVE:
+        move_piece(frm, to)
+    else:
+        remove_piece(to)
+
+def search_move():
+    move = searcher.search(current_engine_board(), SEARCH_TIME).move
+    if move is not None:
+        play_engine_move(move)
+
+def tablebase_move():
+    """Play the tablebase move if the position is covered. Returns True if a move was made."""
+    if tablebase is None or phase not in ("moving", "removal"):
+        return False
+    move = tablebase.best_move(current_engine_board())
+    if move is None:
+        return False
+    play_engine_move(move)
+    return True
+
 def ai_decide_and_move():
     global phase, current_player, info_message, selected_from, removal_mode, paused
     
     # If game is paused, don't make a move
     if paused:
         return
+
+    if tablebase_move():
+        return
+
+    if current_player in SEARCH_PLAYERS:
+        search_move()
+        return
         
     # If in removal phase, perform a random valid removal.
     if phase == "removal":
@@ -414,11 +542,10 @@ def ai_decide_and_move():
         old_state = board_state.copy()
         action_index = agent.select_action(old_state, positions)
         if action_index is not None:
-            pos_list = sorted(positions.keys())
             chosen_pos = pos_list[action_index]
             
             # Place the piece
-            board_state[chosen_pos] = current_player
+            set_point(chosen_pos, current_player)
             pieces_placed[current_player] += 1
             
             # Calculate the reward
@@ -443,7 +570,7 @@ def ai_decide_and_move():
             agent.optimize_model()
             
             # Pause the game after the AI move if auto_pause is enabled
-            if auto_pause:
+            if pausing_after_moves():
                 paused = True
                 info_message += " (Game paused - Press Space to continue)"
             
@@ -460,106 +587,198 @@ def ai_decide_and_move():
             move = random.choice(valid_moves)
             move_piece(move[0], move[1])
 
-# Set a timer event to trigger AI moves every 250 milliseconds.
-if AI_MODE:
-    pygame.time.set_timer(pygame.USEREVENT, 250)
+# ------------------ AI Worker ------------------
+# The AI moves and trains on a worker thread, one step at a time under
+# game_lock. It steps on a fixed timestep of AI_STEP_SECONDS of game time,
+# and sim_speed scales game time against wall time; if it falls behind by
+# more than MAX_BACKLOG_STEPS the backlog is dropped. Turbo drops the
+# timestep and steps flat out, with the window repainting at TURBO_FPS to
+# leave the CPU to the AI. Keys: + / - double or halve the speed, T toggles
+# turbo. Faster than x1 and in turbo the game runs unattended: moves no
+# longer trigger auto-pause.
+AI_STEP_SECONDS = 0.25
+RENDER_FPS = 60
+TURBO_FPS = 10
+MAX_BACKLOG_STEPS = 256
+MIN_SPEED, MAX_SPEED = 0.125, 256
+RESTART_DELAY_MS = 2000
+sim_speed = 1.0
+turbo = False
+stop_ai = threading.Event()
+
+def pausing_after_moves():
+    return auto_pause and not turbo and sim_speed <= 1
+
+def speed_line():
+    if not AI_MODE:
+        return None
+    speed = "turbo" if turbo else f"x{sim_speed:g}"
+    return (f"Speed: {speed}" + (", auto-pause" if pausing_after_moves() else ""), BLACK)
+
+def ai_step():
+    ai_decide_and_move()
+    check_game_over()
+
+def ai_worker():
+    next_step = time.perf_counter()
+    while not stop_ai.is_set():
+        now = time.perf_counter()
+        if paused or game_over:
+            next_step = now + AI_STEP_SECONDS / sim_speed
+            stop_ai.wait(0.01)
+            continue
+        if not turbo:
+            interval = AI_STEP_SECONDS / sim_speed
+            if next_step > now:
+                stop_ai.wait(min(next_step - now, 0.05))  # Wakes up for speed changes too.
+                continue
+            next_step = max(next_step + interval, now - MAX_BACKLOG_STEPS * interval)
+        with game_lock:
+            if not paused and not game_over:
+                ai_step()
+
+def check_game_over():
+    global info_message, game_over
+    if game_over:
+        return
+    for player in ['X', 'O']:
+        if count_pieces(player) < 3 and pieces_placed[player] == TOTAL_PIECES:
+            win_player = 'O' if player == 'X' else 'X'
+            info_message = f"Player {win_player} wins!"
+            win_counts[win_player] += 1
+            game_over = True
+            draw_board()
+            # Terminal rewards update using deep agents.
+            if win_player == 'X':
+                deep_agent_x.update(1, board_state, positions)
+                deep_agent_o.update(-1, board_state, positions)
+            else:
+                deep_agent_x.update(-1, board_state, positions)
+                deep_agent_o.update(1, board_state, positions)
+            # Auto-restart after RESTART_DELAY_MS of game time (at once in turbo).
+            if turbo:
+                reset_game()
+            else:
+                pygame.time.set_timer(AUTO_RESTART_EVENT, max(int(RESTART_DELAY_MS / sim_speed), 1))
+            break
 
 # ----------------------- Main Game Loop -----------------------
 update_layout()
 draw_board()
 
+clock = pygame.time.Clock()
+if AI_MODE:
+    ai_thread = threading.Thread(target=ai_worker, daemon=True)
+    ai_thread.start()
+
 running = True
 while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        elif event.type == pygame.VIDEORESIZE:
-            screen = pygame.display.set_mode(event.size, pygame.RESIZABLE)
-            update_layout()
-            draw_board()
-
-        elif event.type == pygame.KEYDOWN:
-            if not game_over and not AI_MODE:
-                if event.key == pygame.K_r:
-                    reset_game()
-
-            if event.key == pygame.K_SPACE:
-                paused = not paused
-                if paused:
-                    info_message = info_message + " (Game paused - Press Space to continue)" if not "paused" in info_message else info_message
-                else:
-                    info_message = info_message.replace(" (Game paused - Press Space to continue)", "")
+    clock.tick(TURBO_FPS if turbo else RENDER_FPS)
+    events = pygame.event.get()
+    with game_lock:
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+
+            elif event.type == pygame.VIDEORESIZE:
+                screen = pygame.display.set_mode(event.size, pygame.RESIZABLE)
+                update_layout()
+                invalidate_board()
                 draw_board()
 
-            elif event.key == pygame.K_ESCAPE:
-                    running = False
+            elif event.type == pygame.VIDEOEXPOSE:
+                invalidate_board()
+                draw_board()
 
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if not AI_MODE and not game_over:
-                x, y = pygame.mouse.get_pos()
-                if game_over:
-                    if restart_button_rect and restart_button_rect.collidepoint(x, y):
+            elif event.type == pygame.KEYDOWN:
+                if not game_over and not AI_MODE:
+                    if event.key == pygame.K_r:
                         reset_game()
-                        continue
-                    elif exit_button_rect and exit_button_rect.collidepoint(x, y):
-                        running = False
-                        continue
-                clicked_pos = None
-                for pos, coord in positions.items():
-                    pos_coord = (coord[0] + board_offset_x, coord[1] + board_offset_y)
-                    if (x - pos_coord[0])**2 + (y - pos_coord[1])**2 <= 64:
-                        clicked_pos = pos
-                        break
-                if clicked_pos is None:
-                    continue
-                if removal_mode:
-                    remove_piece(clicked_pos)
-                    continue
-                if phase == "placing":
-                    place_piece(clicked_pos)
-                elif phase == "moving":
-                    if selected_from is None:
-                        if board_state[clicked_pos] == current_player:
-                            selected_from = clicked_pos
-                            info_message = f"Selected piece at {selected_from} for moving."
-                        else:
-                            info_message = "Select one of your own pieces to move."
+
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                    if paused:
+                        info_message = info_message + " (Game paused - Press Space to continue)" if not "paused" in info_message else info_message
                     else:
-                        if board_state[clicked_pos] is None:
-                            move_piece(selected_from, clicked_pos)
-                        else:
-                            info_message = "Destination occupied, choose an empty spot."
-                        selected_from = None
+                        info_message = info_message.replace(" (Game paused - Press Space to continue)", "")
                     draw_board()
 
-        elif event.type == pygame.USEREVENT and AI_MODE and not game_over and not paused:
-            ai_decide_and_move()
-            
-        # Handle the auto-restart event.
-        elif event.type == AUTO_RESTART_EVENT and game_over:
-            reset_game()
-            pygame.time.set_timer(AUTO_RESTART_EVENT, 0)
-
-    # Check for win condition.
-    if not game_over:
-        for player in ['X', 'O']:
-            if count_pieces(player) < 3 and pieces_placed[player] == TOTAL_PIECES:
-                win_player = 'O' if player == 'X' else 'X'
-                info_message = f"Player {win_player} wins!"
-                win_counts[win_player] += 1
-                game_over = True
-                draw_board()
-                # Terminal rewards update using deep agents.
-                if win_player == 'X':
-                    deep_agent_x.update(1, board_state, positions)
-                    deep_agent_o.update(-1, board_state, positions)
-                else:
-                    deep_agent_x.update(-1, board_state, positions)
-                    deep_agent_o.update(1, board_state, positions)
-                # Set timer to auto-restart after 2000 milliseconds.
-                pygame.time.set_timer(AUTO_RESTART_EVENT, 2000)
-                break
+                elif event.key == pygame.K_ESCAPE:
+                        running = False
+
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    sim_speed = min(sim_speed * 2, MAX_SPEED)
+                    draw_board()
+
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    sim_speed = max(sim_speed / 2, MIN_SPEED)
+                    draw_board()
+
+                elif event.key == pygame.K_t:
+                    turbo = not turbo
+                    draw_board()
+
+                elif event.key == pygame.K_a:
+                    auto_pause = not auto_pause
+                    draw_board()
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if not AI_MODE and not game_over:
+                    x, y = pygame.mouse.get_pos()
+                    if game_over:
+                        if restart_button_rect and restart_button_rect.collidepoint(x, y):
+                            reset_game()
+                            continue
+                        elif exit_button_rect and exit_button_rect.collidepoint(x, y):
+                            running = False
+                            continue
+                    clicked_pos = None
+                    for pos, coord in positions.items():
+                        pos_coord = (coord[0] + board_offset_x, coord[1] + board_offset_y)
+                        if (x - pos_coord[0])**2 + (y - pos_coord[1])**2 <= 64:
+                            clicked_pos = pos
+                            break
+                    if clicked_pos is None:
+                        continue
+                    if removal_mode:
+                        remove_piece(clicked_pos)
+                        continue
+                    if phase == "placing":
+                        place_piece(clicked_pos)
+                    elif phase == "moving":
+                        if selected_from is None:
+                            if board_state[clicked_pos] == current_player:
+                                selected_from = clicked_pos
+                                info_message = f"Selected piece at {selected_from} for moving."
+                            else:
+                                info_message = "Select one of your own pieces to move."
+                        else:
+                            if board_state[clicked_pos] is None:
+                                move_piece(selected_from, clicked_pos)
+                            else:
+                                info_message = "Destination occupied, choose an empty spot."
+                            selected_from = None
+                        draw_board()
+
+            # Handle the auto-restart event.
+            elif event.type == AUTO_RESTART_EVENT and game_over:
+                reset_game()
+                pygame.time.set_timer(AUTO_RESTART_EVENT, 0)
+
+        if not AI_MODE:
+            # Check for win condition.
+            check_game_over()
+
+    # Resizes and exposes repaint in full from the last snapshot. The flag is
+    # cleared together with taking the snapshot, so one published after that
+    # is painted on the next frame.
+    if redraw_pending or static_board is None:
+        with game_lock:
+            redraw_pending = False
+            view = snapshot
+        render_board(view)
+
+stop_ai.set()
 
 pygame.quit()
 sys.exit()
\ No newline at end of file
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Alpha-beta search player on top of the bitboard engine.
+
+Negamax with iterative deepening under a hard wall-clock budget. A mill
+lets the same player move again (the removal), so the score is only negated
+when the side to move actually changes, and removals do not use up depth:
+a mill is always searched together with the piece it takes. Moves are
+ordered removals and mill-forming moves first, then mill blocks, killer
+moves and the history heuristic. Repeated positions in the moving phase
+(found by Board.hash) score as draws.
+
+Searcher.search returns the move with its score, the depth completed and
+node counts, so it can stand in for the random or DQN policy in any phase.
+
+    python search.py --time 2 --random-plies 20
+"""
+import argparse
+import random
+import sys
+import time
+
+from engine import (ADJ_MASKS, FULL_MASK, MOVING, PHASE_NAMES, PLAYERS, POINT_MILLS, REMOVAL,
+                    REMOVE, TOTAL_PIECES, Board, iter_bits, move_to_str, popcount)
+from ttable import EXACT, LOWER, UPPER, TranspositionTable
+
+WIN = 100000
+INFINITY = WIN + 1
+# Scores within this distance of WIN are forced wins (WIN - plies to the win).
+WIN_THRESHOLD = WIN - 1000
+
+# Evaluation weights, in points of a piece = 100.
+PIECE = 100
+THREAT = 25     # A mill with two own pieces and an empty third point.
+MILL = 10       # A standing mill, which can be opened and closed again.
+MOBILITY = 3    # Per adjacent step available in the moving phase.
+
+# Move ordering scores.
+ORDER_REMOVE = 4000
+ORDER_MILL = 3000
+ORDER_BLOCK = 2000
+ORDER_KILLER = (1500, 1400)
+
+DEFAULT_TABLE_MB = 16
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult:
+    def __init__(self, move, score, depth, nodes, elapsed, pv=()):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.pv = pv
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        line = " ".join(move_to_str(m) for m in self.pv) or "-"
+        return (f"depth {self.depth} score {self.score} nodes {self.nodes} "
+                f"nps {self.nps:.0f} time {self.elapsed:.3f}s pv {line}")
+
+
+def evaluate(board):
+    """Static score of a quiet position from the side to move's point of view."""
+    side = board.current
+    score = 0
+    empty = FULL_MASK & ~(board.pieces[0] | board.pieces[1])
+    for player, sign in ((side, 1), (1 - side, -1)):
+        bits = board.pieces[player]
+        count = popcount(bits)
+        lines = board.open_lines[player]
+        value = PIECE * (count + TOTAL_PIECES - board.placed[player]) + THREAT * lines[2] + MILL * lines[3]
+        if board.phase == MOVING and count > 3:
+            for idx in iter_bits(bits):
+                value += MOBILITY * popcount(ADJ_MASKS[idx] & empty)
+        score += sign * value
+    return score
+
+
+def _to_table(score, ply):
+    # Forced wins are stored as distance from this node, not from the root.
+    if score >= WIN_THRESHOLD:
+        return score + ply
+    if score <= -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+def _from_table(score, ply):
+    if score >= WIN_THRESHOLD:
+        return score - ply
+    if score <= -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+class Searcher:
+    def __init__(self, table=None):
+        self.table = table if table is not None else TranspositionTable(DEFAULT_TABLE_MB)
+        self.history = [0] * 4096       # Indexed by move code.
+        self.killers = [[-1, -1] for _ in range(128)]
+        self.nodes = 0
+        self.deadline = None
+        self.path = []
+
+    def order_moves(self, board, moves, ply, first=None):
+        side = board.current
+        own = board.mill_counts[side]
+        opp = board.mill_counts[1 - side]
+        killers = self.killers[ply] if ply < len(self.killers) else (-1, -1)
+        history = self.history
+        scored = []
+        for move in moves:
+            if move == first:
+                scored.append((1 << 30, move))
+                continue
+            kind = move >> 10
+            to = move & 31
+            score = history[move]
+            if kind == REMOVE:
+                # Prefer taking pieces that are part of the opponent's threats.
+                score += ORDER_REMOVE + sum(100 for m in POINT_MILLS[to] if opp[m] == 2 and own[m] == 0)
+            else:
+                frm_mills = POINT_MILLS[(move >> 5) & 31] if kind else ()
+                for m in POINT_MILLS[to]:
+                    if own[m] - (m in frm_mills) == 2:
+                        score += ORDER_MILL
+                    elif opp[m] == 2:
+                        score += ORDER_BLOCK
+                if move == killers[0]:
+                    score += ORDER_KILLER[0]
+                elif move == killers[1]:
+                    score += ORDER_KILLER[1]
+            scored.append((score, move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def search(self, board, time_limit=1.0, max_depth=64, info=None):
+        """
+        Search board for up to time_limit seconds (None for no limit) or
+        max_depth plies. Returns the SearchResult of the deepest completed
+        iteration; info(result) is called after each one.
+        """
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit is not None else None
+        self.nodes = 0
+        self.table.new_search()
+        # Positions already on the board's history count as repetitions too.
+        self.path = [entry[-1] for entry in board.history]
+        moves = board.legal_moves()
+        if not moves:
+            return SearchResult(None, -WIN, 0, 0, 0.0)
+        history_len = len(board.history)
+        entry = self.table.probe(board.hash)
+        first = entry[3] if entry is not None and entry[3] in moves else None
+        result = SearchResult(self.order_moves(board, moves, 0, first)[0], 0, 0, 0, 0.0)
+        for depth in range(1, max_depth + 1):
+            try:
+                score, pv = self._root(board, moves, depth, result.move)
+            except SearchTimeout:
+                while len(board.history) > history_len:
+                    board.undo_move()
+                break
+            result = SearchResult(pv[0], score, depth, self.nodes, time.perf_counter() - start, pv)
+            if info is not None:
+                info(result)
+            if abs(score) >= WIN_THRESHOLD or len(moves) == 1:
+                break
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _root(self, board, moves, depth, best_move):
+        side = board.current
+        alpha, beta = -INFINITY, INFINITY
+        best_pv = [best_move]
+        for move in self.order_moves(board, moves, 0, best_move):
+            board.make_move(move)
+            if board.current == side:
+                score, pv = self._negamax(board, depth if move >> 10 == REMOVE else depth - 1, alpha, beta, 1)
+            else:
+                score, pv = self._negamax(board, depth if move >> 10 == REMOVE else depth - 1, -beta, -alpha, 1)
+                score = -score
+            board.undo_move()
+            if score > alpha:
+                alpha = score
+                best_pv = [move] + pv
+        self.table.store(board.hash, alpha, depth, EXACT, best_pv[0])
+        return alpha, best_pv
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        side = board.current
+        for player in (0, 1):
+            if board.placed[player] == TOTAL_PIECES and popcount(board.pieces[player]) < 3:
+                return (WIN - ply if player != side else ply - WIN), []
+        phase = board.phase
+        if phase == MOVING and board.hash in self.path:
+            return 0, []
+        if depth <= 0 and phase != REMOVAL:
+            return evaluate(board), []
+        key = board.hash
+        exact_key = board.key() if self.table.exact is not None else None
+        table_move = None
+        entry = self.table.probe(key, exact_key)
+        if entry is not None:
+            score, entry_depth, bound, table_move = entry
+            if entry_depth >= depth:
+                score = _from_table(score, ply)
+                if (bound == EXACT or (bound == LOWER and score >= beta)
+                        or (bound == UPPER and score <= alpha)):
+                    return score, [table_move] if table_move is not None else []
+        moves = board.legal_moves()
+        if not moves:
+            return ply - WIN, []
+
+        alpha_start = alpha
+        best = -INFINITY
+        best_pv = []
+        self.path.append(key)
+        try:
+            for move in self.order_moves(board, moves, ply, table_move):
+                board.make_move(move)
+                child_depth = depth if move >> 10 == REMOVE else depth - 1
+                if board.current == side:
+                    score, pv = self._negamax(board, child_depth, alpha, beta, ply + 1)
+                else:
+                    score, pv = self._negamax(board, child_depth, -beta, -alpha, ply + 1)
+                    score = -score
+                board.undo_move()
+                if score > best:
+                    best = score
+                    best_pv = [move] + pv
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            self._record_cutoff(move, depth, ply)
+                            break
+        finally:
+            self.path.pop()
+        bound = LOWER if best >= beta else UPPER if best <= alpha_start else EXACT
+        self.table.store(key, _to_table(best, ply), depth, bound, best_pv[0], exact_key)
+        return best, best_pv
+
+    def _record_cutoff(self, move, depth, ply):
+        if move >> 10 == REMOVE:
+            return
+        self.history[move] += depth * depth
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+
+def choose_move(board, time_limit=1.0, searcher=None):
+    """Best move for the side to move within time_limit seconds."""
+    return (searcher or Searcher()).search(board, time_limit).move
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a Morabaraba position.")
+    parser.add_argument("--time", type=float, default=1.0, help="seconds per move")
+    parser.add_argument("--depth", type=int, default=64, help="maximum depth")
+    parser.add_argument("--random-plies", type=int, default=0, help="start from a random game this many plies in")
+    parser.add_argument("--play", action="store_true", help="play the game out with the searcher on both sides")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    board = Board(rng.choice((0, 1)))
+    for _ in range(args.random_plies):
+        moves = board.legal_moves()
+        if not moves or board.winner() is not None:
+            break
+        board.make_move(rng.choice(moves))
+    print(board)
+    print(f"{PLAYERS[board.current]} to move, {PHASE_NAMES[board.phase]}")
+
+    searcher = Searcher()
+    if not args.play:
+        result = searcher.search(board, args.time, args.depth, info=print)
+        print(f"best {move_to_str(result.move)} ({result.nodes} nodes, {result.nps:.0f} nodes/s)")
+        return 0
+    plies = 0
+    while board.winner() is None and plies < 400:
+        result = searcher.search(board, args.time, args.depth)
+        print(f"{PLAYERS[board.current]} {move_to_str(result.move)}: {result}")
+        board.make_move(result.move)
+        plies += 1
+    print(board)
+    winner = board.winner()
+    print(f"winner {PLAYERS[winner] if winner is not None else None} after {plies} plies")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
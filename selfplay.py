@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Headless self-play trainer: two DeepQAgents play each other through engine.py
+with no window, timers or font rendering.
+
+The game flow and rewards follow ai_decide_and_move in runv4Revised.py: the
+agents choose placements and learn from them, removals and moves are random
+legal choices (or, with --search-workers, chosen by parallel_search.py's
+root-parallel or shared-tree MCTS), and at game end the winner gets
+update(1) and the loser update(-1).
+
+Training runs --replay-ratio gradient steps per stored transition. With
+--steps-per-block K they are batched: K batches are sampled and gathered
+together and trained on back to back, which pays off with large batches.
+
+    python selfplay.py --games 5000 --checkpoint-every 500
+    python selfplay.py --batch-size 1024 --replay-ratio 0.25 --steps-per-block 8
+    python selfplay.py --search-workers 8 --search-mode tree --search-model model_x.pth
+"""
+import argparse
+import os
+import random
+import time
+
+from ai_dqn import DeepQAgent
+from engine import PLACE, PLACING, PLAYERS, POINTS, X, O, Board, encode_move
+from game_codec import append_game, encode_played
+
+# DeepQAgent only uses the keys of `positions` (for point order).
+positions = dict.fromkeys(POINTS)
+
+
+def play_game(agent_x, agent_o, max_plies=1000, train=True, record=None, first_player=None, chooser=None):
+    """
+    Play one game to the end (or max_plies). Returns (winner, moves) where
+    winner is engine.X / engine.O or None for an unfinished game and moves is
+    the list of engine move codes played.
+
+    With record set, transitions are handed to record(player, state, action,
+    reward, next_state, done) instead of being trained on in place.
+    first_player defaults to a random choice, as in the runners.
+    chooser(board) -> move, if given, picks the moving and removal moves of
+    both players instead of a random legal move.
+    """
+    if first_player is None:
+        first_player = random.choice((X, O))
+    board = Board(first_player)
+    agents = (agent_x, agent_o)
+    moves = []
+    winner = None
+    while len(moves) < max_plies:
+        winner = board.winner()
+        if winner is not None:
+            break
+        player = board.current
+        if board.phase == PLACING:
+            agent = agents[player]
+            old_state = board.to_dict()
+            action_index = agent.select_action(old_state, positions)
+            move = encode_move(PLACE, 0, action_index)
+            if board.make_move(move):
+                reward = 5.0  # Significant reward for forming a mill
+            else:
+                reward = board.mill_setup_reward(player) + board.block_opponent_reward(player)
+            if record is not None:
+                record(player, old_state, action_index, reward, board.to_dict(), False)
+            elif train:
+                agent.store_transition(old_state, positions, action_index, reward, board.to_dict(), False)
+                agent.optimize_model()
+        else:
+            # Removal and moving stay random, as in the pygame runner, unless searched.
+            move = chooser(board) if chooser is not None else None
+            if move is None:
+                move = random.choice(board.legal_moves())
+            board.make_move(move)
+        moves.append(move)
+
+    if winner is not None and (train or record is not None):
+        final_state = board.to_dict()
+        for player, reward in ((winner, 1), (1 - winner, -1)):
+            agent = agents[player]
+            if record is None:
+                agent.update(reward, final_state, positions)
+            elif agent.last_state is not None:
+                # Same terminal transition DeepQAgent.update would store.
+                record(player, agent.last_state, agent.last_action, reward, final_state, True)
+    return winner, moves
+
+
+def save_checkpoint(agents, args):
+    agent_x, agent_o = agents
+    agent_x.save_model(args.model_x)
+    agent_o.save_model(args.model_o)
+    if args.replay_dir:
+        agent_x.replay_buffer.flush()
+        agent_o.replay_buffer.flush()
+    elif not args.no_buffers:
+        agent_x.save_replay_buffer(args.buffer_x)
+        agent_o.save_replay_buffer(args.buffer_o)
+
+
+def add_training_args(parser):
+    """Options shared by the self-play trainer and the actor pool."""
+    parser.add_argument("--games", type=int, default=1000, help="number of games to play")
+    parser.add_argument("--checkpoint-every", type=int, default=100,
+                        help="save models (and buffers) every N games; 0 saves only at the end")
+    parser.add_argument("--log-every", type=int, default=50, help="print progress every N games")
+    parser.add_argument("--max-plies", type=int, default=1000,
+                        help="abandon a game as unfinished after this many plies")
+    parser.add_argument("--epsilon", type=float, default=0.2, help="exploration rate for both agents")
+    parser.add_argument("--prioritized", action="store_true", help="use prioritized experience replay")
+    parser.add_argument("--batch-size", type=int, default=32, help="transitions per gradient step")
+    parser.add_argument("--replay-ratio", type=float, default=1.0,
+                        help="gradient steps per stored transition (may be fractional)")
+    parser.add_argument("--steps-per-block", type=int, default=1, metavar="K",
+                        help="sample K batches at once and train on them back to back")
+    parser.add_argument("--augment", type=int, default=0, metavar="K",
+                        help="train on K random board symmetries of each sampled transition (max 16)")
+    parser.add_argument("--book", default=None, help="opening book (see opening_book.py) for the placing phase")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--fresh", action="store_true", help="start from new networks instead of saved ones")
+    parser.add_argument("--no-buffers", action="store_true", help="do not load or save replay buffers")
+    parser.add_argument("--model-x", default="model_x.pth")
+    parser.add_argument("--model-o", default="model_o.pth")
+    parser.add_argument("--buffer-x", default="buffer_x.pkl")
+    parser.add_argument("--buffer-o", default="buffer_o.pkl")
+    parser.add_argument("--buffer-capacity", type=int, default=10000)
+    parser.add_argument("--replay-dir", default=None,
+                        help="keep replay in memory-mapped stores under this directory instead of pickles")
+
+
+def check_training_args(parser, args):
+    if args.replay_dir and args.prioritized:
+        parser.error("--prioritized keeps its sum tree in memory and cannot be combined with --replay-dir")
+    if not 0 <= args.augment <= 16:
+        parser.error("--augment must be between 0 and 16")
+    if args.batch_size < 1 or args.steps_per_block < 1:
+        parser.error("--batch-size and --steps-per-block must be positive")
+    if args.replay_ratio <= 0:
+        parser.error("--replay-ratio must be positive")
+
+
+def load_agents(args):
+    agent_x = DeepQAgent('X', epsilon=args.epsilon, buffer_capacity=args.buffer_capacity,
+                         batch_size=args.batch_size, prioritized=args.prioritized, augment=args.augment,
+                         replay_ratio=args.replay_ratio, steps_per_block=args.steps_per_block)
+    agent_o = DeepQAgent('O', epsilon=args.epsilon, buffer_capacity=args.buffer_capacity,
+                         batch_size=args.batch_size, prioritized=args.prioritized, augment=args.augment,
+                         replay_ratio=args.replay_ratio, steps_per_block=args.steps_per_block)
+    if not args.fresh:
+        agent_x.load_model(args.model_x)
+        agent_o.load_model(args.model_o)
+        if not args.no_buffers and not args.replay_dir:
+            agent_x.load_replay_buffer(args.buffer_x)
+            agent_o.load_replay_buffer(args.buffer_o)
+    if args.replay_dir:
+        from replay_store import MemmapReplayBuffer
+        for agent in (agent_x, agent_o):
+            directory = os.path.join(args.replay_dir, agent.player.lower())
+            capacity = None if os.path.exists(os.path.join(directory, "header.bin")) else args.buffer_capacity
+            agent.replay_buffer = MemmapReplayBuffer(directory, capacity)
+    if args.book:
+        from opening_book import OpeningBook
+        agent_x.book = agent_o.book = OpeningBook(args.book)
+    return agent_x, agent_o
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Morabaraba DQN self-play trainer.")
+    add_training_args(parser)
+    parser.add_argument("--game-log", default=None,
+                        help="append every game to this binary record file (see game_codec.py)")
+    parser.add_argument("--search-workers", type=int, default=0,
+                        help="choose moving and removal moves with parallel MCTS on this many processes")
+    parser.add_argument("--search-mode", choices=("root", "tree"), default="root",
+                        help="root-parallel or shared-tree search (see parallel_search.py)")
+    parser.add_argument("--search-time", type=float, default=0.1, help="seconds per searched move")
+    parser.add_argument("--search-model", default=None, help="DQN weights for the search priors (default: uniform)")
+    args = parser.parse_args(argv)
+    check_training_args(parser, args)
+    if args.search_workers < 0 or args.search_time <= 0:
+        parser.error("--search-workers must be 0 or more and --search-time positive")
+    return args
+
+
+def make_chooser(args):
+    """(chooser for play_game, searcher to close) for --search-workers, or (None, None)."""
+    if not args.search_workers:
+        return None, None
+    from parallel_search import RootParallelMCTS, SharedTreeMCTS
+    if args.search_mode == "root":
+        searcher = RootParallelMCTS(args.search_workers, args.search_model)
+    else:
+        searcher = SharedTreeMCTS(args.search_workers, model=args.search_model)
+    return (lambda board: searcher.search(board, 10 ** 9, args.search_time).move), searcher
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+        import torch
+        torch.manual_seed(args.seed)
+
+    agents = load_agents(args)
+    agent_x, agent_o = agents
+
+    win_counts = {'X': 0, 'O': 0, None: 0}
+    total_moves = 0
+    start = time.time()
+    chooser, searcher = make_chooser(args)
+    try:
+        for game in range(1, args.games + 1):
+            first_player = random.choice((X, O))
+            winner, moves = play_game(agent_x, agent_o, max_plies=args.max_plies, first_player=first_player,
+                                      chooser=chooser)
+            if args.game_log:
+                winner_name = PLAYERS[winner] if winner is not None else None
+                append_game(args.game_log, encode_played(moves, first_player, winner_name))
+            win_counts[PLAYERS[winner] if winner is not None else None] += 1
+            total_moves += len(moves)
+
+            if args.log_every and game % args.log_every == 0:
+                elapsed = time.time() - start
+                print(f"game {game}: wins X {win_counts['X']} O {win_counts['O']} unfinished {win_counts[None]} | "
+                      f"{game / elapsed:.1f} games/s, {total_moves / elapsed:.0f} moves/s")
+            if args.checkpoint_every and game % args.checkpoint_every == 0:
+                save_checkpoint(agents, args)
+    finally:
+        if searcher is not None:
+            searcher.close()
+
+    save_checkpoint(agents, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+The 16 symmetries of the Morabaraba board.
+
+Points are placed on a grid with columns a-g and rows 1-7 mapped to -3..3.
+The eight rotations and reflections of the square, each optionally combined
+with swapping the inner and outer rings (radius 1 <-> 3), map mills to mills
+and neighbours to neighbours, so equivalent positions have the same value
+and their moves correspond point for point.
+
+PERMS[s][i] is the point that point i goes to under symmetry s (0 is the
+identity) and INVERSE[s] undoes it. canonical() picks one representative per
+class of equivalent boards, which shrinks position-keyed tables and caches
+by up to 16x; the NumPy helpers transform, canonicalise and deduplicate the
+int8 state arrays the replay buffers hold.
+
+    python symmetry.py dedup buffer_x.pkl buffer_x_dedup.pkl
+"""
+import pickle
+import sys
+
+import numpy as np
+
+from engine import ADJACENT, MILLS, MOVE, NUM_POINTS, POINT_INDEX, POINTS
+
+
+def _coords(name):
+    return ord(name[0]) - ord('d'), int(name[1]) - 4
+
+def _square(s, x, y):
+    # Symmetries 0-3 rotate by s * 90 degrees, 4-7 also mirror in x.
+    if s >= 4:
+        x = -x
+    for _ in range(s % 4):
+        x, y = -y, x
+    return x, y
+
+def _swap_rings(x, y):
+    radius = max(abs(x), abs(y))
+    scale = {1: 3, 2: 1, 3: 1 / 3}[radius]
+    return int(round(x * scale)), int(round(y * scale))
+
+def _build():
+    at = {_coords(name): i for i, name in enumerate(POINTS)}
+    perms = []
+    for swap in (False, True):
+        for s in range(8):
+            perm = []
+            for name in POINTS:
+                x, y = _square(s, *_coords(name))
+                if swap:
+                    x, y = _swap_rings(x, y)
+                perm.append(at[(x, y)])
+            perms.append(tuple(perm))
+    return tuple(perms)
+
+PERMS = _build()
+NUM_SYMMETRIES = len(PERMS)
+INVERSE = tuple(tuple(sorted(range(NUM_POINTS), key=perm.__getitem__)) for perm in PERMS)
+
+
+def _check():
+    mills = {frozenset(POINT_INDEX[p] for p in mill) for mill in MILLS}
+    edges = {frozenset((POINT_INDEX[a], POINT_INDEX[b])) for a, adj in ADJACENT.items() for b in adj}
+    for perm in PERMS:
+        if {frozenset(perm[i] for i in mill) for mill in mills} != mills:
+            raise AssertionError("symmetry does not preserve mills")
+        if {frozenset(perm[i] for i in edge) for edge in edges} != edges:
+            raise AssertionError("symmetry does not preserve adjacency")
+    if len(set(PERMS)) != NUM_SYMMETRIES:
+        raise AssertionError("symmetries are not distinct")
+
+_check()
+
+# Bitboards are transformed a byte at a time: BYTE_TABLES[s][k][b] is the
+# image of byte value b sitting in byte k of a 24-bit board.
+BYTE_TABLES = tuple(
+    tuple(tuple(sum(1 << perm[8 * k + j] for j in range(8) if b >> j & 1) for b in range(256))
+          for k in range(3))
+    for perm in PERMS)
+
+# As arrays for the vectorized helpers.
+PERM_ARRAY = np.array(PERMS, dtype=np.int64)
+INVERSE_ARRAY = np.array(INVERSE, dtype=np.int64)
+
+
+def transform_bits(bits, s):
+    low, mid, high = BYTE_TABLES[s]
+    return low[bits & 0xFF] | mid[(bits >> 8) & 0xFF] | high[bits >> 16]
+
+def transform_move(move, s):
+    """Image of an engine move code under symmetry s."""
+    perm = PERMS[s]
+    kind = move >> 10
+    frm = perm[(move >> 5) & 31] if kind == MOVE else 0
+    return (kind << 10) | (frm << 5) | perm[move & 31]
+
+def transform_action(action, s):
+    """Image of a DQN action (a point index) under symmetry s."""
+    return PERMS[s][action]
+
+def inverse_of(s):
+    return PERMS.index(INVERSE[s])
+
+def transform_board(board, s):
+    """A new Board with the position transformed by s (history is not carried over)."""
+    image = board.copy()
+    image.pieces = [transform_bits(board.pieces[0], s), transform_bits(board.pieces[1], s)]
+    image.recount()
+    return image
+
+
+def canonical_bits(x_bits, o_bits):
+    """(x_bits, o_bits, s) for the smallest image of the pieces over all symmetries."""
+    best = (x_bits | o_bits << 24, x_bits, o_bits, 0)
+    for s in range(1, NUM_SYMMETRIES):
+        x, o = transform_bits(x_bits, s), transform_bits(o_bits, s)
+        if x | o << 24 < best[0]:
+            best = (x | o << 24, x, o, s)
+    return best[1:]
+
+def canonical(board):
+    """
+    (key, s): the Board.key() of the canonical representative of board and
+    the symmetry that maps board onto it. A move m in board is
+    transform_move(m, s) in the representative; map replies back with
+    inverse_of(s).
+    """
+    x_bits, o_bits, s = canonical_bits(*board.pieces)
+    return (board.key() >> 48 << 48) | x_bits | (o_bits << 24), s
+
+def canonical_hash(board):
+    """Zobrist hash of the canonical representative of board."""
+    x_bits, o_bits, s = canonical_bits(*board.pieces)
+    if s == 0:
+        return board.hash
+    return transform_board(board, s).hash
+
+
+# Replay states are int8 vectors over POINTS (1 own, -1 opponent, 0 empty).
+_POWERS = 3 ** np.arange(NUM_POINTS, dtype=np.int64)
+
+def transform_states(states, s):
+    """Apply symmetry s (an int or one per row) to an (N, 24) array of states."""
+    if np.ndim(s) == 0:
+        return states[:, INVERSE_ARRAY[s]]
+    return np.take_along_axis(states, INVERSE_ARRAY[s], axis=1)
+
+def state_keys(states):
+    """Exact int64 key per state row (base-3 digits)."""
+    return (states.astype(np.int64) + 1) @ _POWERS
+
+def all_images(states):
+    """(16, N, 24) array of every state under every symmetry."""
+    return states[:, INVERSE_ARRAY].transpose(1, 0, 2)
+
+def unique_transitions(states, actions, next_states):
+    """
+    Indices of the first transition of each symmetry class. Two transitions
+    are the same if one symmetry maps state, action and next state of one
+    onto the other; rewards and done flags follow from those.
+    """
+    if len(states) == 0:
+        return np.zeros(0, dtype=np.int64)
+    state_images = state_keys(all_images(states))                   # (16, N)
+    next_images = state_keys(all_images(next_states))
+    action_images = PERM_ARRAY[:, actions.astype(np.int64)]         # (16, N)
+    first = state_images * NUM_POINTS + action_images
+    # Lexicographic minimum over (state, action, next state) per transition.
+    best = first.min(axis=0)
+    next_images = np.where(first == best, next_images, np.iinfo(np.int64).max)
+    s = next_images.argmin(axis=0)
+    columns = np.arange(len(states))
+    keys = np.stack([first[s, columns], next_images[s, columns]], axis=1)
+    _, index = np.unique(keys, axis=0, return_index=True)
+    return np.sort(index)
+
+
+def dedup_buffer(buffer):
+    """A new ReplayBuffer (same capacity) holding one transition per symmetry class, oldest first."""
+    from ai_dqn import ReplayBuffer
+    start = buffer.position if buffer.size == buffer.capacity else 0
+    order = (start + np.arange(buffer.size)) % buffer.capacity
+    states = np.asarray(buffer.states[order])
+    keep = order[unique_transitions(states, np.asarray(buffer.actions[order]),
+                                    np.asarray(buffer.next_states[order]))]
+    deduped = ReplayBuffer(buffer.capacity, buffer.states.shape[1])
+    count = len(keep)
+    deduped.states[:count] = buffer.states[keep]
+    deduped.actions[:count] = buffer.actions[keep]
+    deduped.rewards[:count] = buffer.rewards[keep]
+    deduped.next_states[:count] = buffer.next_states[keep]
+    deduped.dones[:count] = buffer.dones[keep]
+    deduped.size = count
+    deduped.position = count % buffer.capacity
+    return deduped
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] != "dedup":
+        print("usage: python symmetry.py dedup BUFFER.pkl OUT.pkl")
+        return 1
+    from ai_dqn import ReplayBuffer
+    with open(argv[1], "rb") as f:
+        buffer = pickle.load(f)
+    if hasattr(buffer, "buffer"):  # Pickled by the old list-based ReplayBuffer.
+        buffer = ReplayBuffer.from_legacy(buffer)
+    deduped = dedup_buffer(buffer)
+    with open(argv[2], "wb") as f:
+        pickle.dump(deduped, f)
+    print(f"{len(buffer)} -> {len(deduped)} transitions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Retrograde endgame tablebase for the moving phase.
+
+Covers every position with all pieces placed and between 3 and MAX pieces
+per side, from the side to move's point of view. A move that closes a mill
+is taken together with its removal, so every position in a table has a
+plain move to make and its successors lie either in the partner table (the
+opponent to move, same piece counts) or, after a removal, in a table with
+one piece fewer. Tables are solved in order of total pieces; within a total
+the two partner tables are solved together level by level: a position is a
+win in n plies if some option reaches a loss in n - 1, and a loss in n if
+every option reaches a win in at most n - 1 (with one at n - 1). Whatever
+is left unresolved is a draw.
+
+Positions are indexed perfectly by combinatorial ranking: the colex rank of
+the mover's point set times C(24 - a, b), plus the rank of the opponent's
+points among the 24 - a points the mover leaves free. Each table is a WDL
+file with 2 bits per position (0 draw, 1 win, 2 loss) and a sidecar with the
+distance to result in plies (uint8), both behind a 16-byte header and
+memory-mapped by Tablebase for probing.
+
+    python tablebase.py build tablebase --max-pieces 3
+    python tablebase.py probe tablebase --random 5
+"""
+import argparse
+import math
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from engine import (ADJ_MASKS, FULL_MASK, MILL_MASKS, MOVING, NUM_POINTS, POINT_MILL_MASKS, REMOVAL,
+                    TOTAL_PIECES, move_to_str, popcount)
+
+DRAW, WIN, LOSS = 0, 1, 2
+RESULT_NAMES = ("draw", "win", "loss")
+MIN_PIECES = 3
+FLYING = 3          # Pieces at which a player may fly.
+
+MAGIC = b"MORATB01"
+HEADER = struct.Struct("<8sBBBBI")  # magic, own pieces, opponent pieces, kind, pad, positions
+KIND_WDL, KIND_DTR = 0, 1
+CHUNK = 1 << 16
+UNSET = np.iinfo(np.int16).max
+
+BINOM = np.array([[math.comb(n, r) for r in range(NUM_POINTS + 1)] for n in range(NUM_POINTS + 1)],
+                 dtype=np.int64)
+BIT = np.array([1 << p for p in range(NUM_POINTS)], dtype=np.int64)
+ADJ = np.array(ADJ_MASKS, dtype=np.int64)
+MILL_FIRST = np.array([masks[0] for masks in POINT_MILL_MASKS], dtype=np.int64)
+MILL_SECOND = np.array([masks[1] for masks in POINT_MILL_MASKS], dtype=np.int64)
+
+
+def table_size(own, opp):
+    return math.comb(NUM_POINTS, own) * math.comb(NUM_POINTS - own, opp)
+
+
+def rank(own_bits, opp_bits, own, opp):
+    """Index of a position (mover's bits, opponent's bits) in table (own, opp)."""
+    own_rank = opp_rank = 0
+    i = k = free = 0
+    for p in range(NUM_POINTS):
+        if own_bits >> p & 1:
+            i += 1
+            own_rank += math.comb(p, i)
+        else:
+            if opp_bits >> p & 1:
+                k += 1
+                opp_rank += math.comb(free, k)
+            free += 1
+    return own_rank * math.comb(NUM_POINTS - own, opp) + opp_rank
+
+
+def _byte_tables():
+    # Colex contributions of the set bits of byte k given how many lower bits are set.
+    byte = np.arange(256)
+    colex = np.zeros((3, 256, NUM_POINTS + 1), dtype=np.int64)
+    for k in range(3):
+        for below in range(NUM_POINTS + 1):
+            ordinal = np.full(256, below)
+            for q in range(8):
+                bit = (byte >> q) & 1
+                ordinal = ordinal + bit
+                colex[k, :, below] += bit * BINOM[8 * k + q][np.minimum(ordinal, NUM_POINTS)]
+    # Bits of an opponent byte gathered onto the points the own byte leaves free.
+    opp, own = np.meshgrid(byte, byte, indexing="ij")
+    packed = np.zeros((256, 256), dtype=np.int64)
+    free = np.zeros((256, 256), dtype=np.int64)
+    for q in range(8):
+        empty = 1 - ((own >> q) & 1)
+        packed |= (((opp >> q) & 1) * empty) << free
+        free += empty
+    return colex, packed, free
+
+
+COLEX, PACKED, FREE = _byte_tables()
+POPCOUNT8 = np.array([bin(b).count("1") for b in range(256)], dtype=np.int64)
+
+
+def _colex_many(bits):
+    b0, b1, b2 = bits & 255, (bits >> 8) & 255, bits >> 16
+    c0 = POPCOUNT8[b0]
+    return COLEX[0, b0, 0] + COLEX[1, b1, c0] + COLEX[2, b2, c0 + POPCOUNT8[b1]]
+
+
+def rank_many(own_bits, opp_bits, own, opp):
+    """Vectorized rank() over int64 arrays of bitboards."""
+    compressed = 0
+    shift = 0
+    for k in range(3):
+        ob = (opp_bits >> (8 * k)) & 255
+        wb = (own_bits >> (8 * k)) & 255
+        compressed = compressed | PACKED[ob, wb] << shift
+        shift = shift + FREE[ob, wb]
+    return _colex_many(own_bits) * math.comb(NUM_POINTS - own, opp) + _colex_many(compressed)
+
+
+def _unrank_colex(ranks, count, limit):
+    """Point indices (count arrays, highest first) of the colex-ranked subsets of range(limit)."""
+    points = []
+    ranks = ranks.copy()
+    for i in range(count, 0, -1):
+        column = BINOM[:limit, i]
+        p = np.searchsorted(column, ranks, side="right") - 1
+        ranks -= column[p]
+        points.append(p)
+    return points
+
+
+def unrank_many(indices, own, opp):
+    """Bitboards and piece point indices for table positions at indices."""
+    span = math.comb(NUM_POINTS - own, opp)
+    own_points = _unrank_colex(indices // span, own, NUM_POINTS)
+    free_points = _unrank_colex(indices % span, opp, NUM_POINTS - own)
+    own_bits = np.zeros(len(indices), dtype=np.int64)
+    for p in own_points:
+        own_bits |= BIT[p]
+    # The opponent's points were ranked among the free points: map them back.
+    opp_points = [np.zeros(len(indices), dtype=np.int64) for _ in range(opp)]
+    seen = np.zeros(len(indices), dtype=np.int64)
+    for p in range(NUM_POINTS):
+        free = ((own_bits >> p) & 1) == 0
+        for e, q in enumerate(free_points):
+            opp_points[e] = np.where(free & (seen == q), p, opp_points[e])
+        seen += free
+    opp_bits = np.zeros(len(indices), dtype=np.int64)
+    for p in opp_points:
+        opp_bits |= BIT[p]
+    return own_bits, opp_bits, own_points, opp_points
+
+
+def _mill_points_many(bits):
+    covered = np.zeros(len(bits), dtype=np.int64)
+    for mask in MILL_MASKS:
+        covered |= np.where(bits & mask == mask, mask, 0)
+    return covered
+
+
+def _options(own_bits, opp_bits, own_points, opp_points, own, opp):
+    """
+    Yield (rows, kind, successor index) for every option of the chunk: kind
+    "move" for a plain move into table (opp, own), "mill" for a mill and
+    removal into table (opp - 1, own), "win" for a mill that leaves the
+    opponent with fewer than three pieces.
+    """
+    empty = FULL_MASK & ~(own_bits | opp_bits)
+    covered = _mill_points_many(opp_bits)
+    removable = opp_bits & ~covered
+    removable = np.where(removable == 0, opp_bits, removable)
+    for frm in own_points:
+        base = own_bits ^ BIT[frm]
+        reach = empty if own == FLYING else empty & ADJ[frm]
+        for t in range(NUM_POINTS):
+            valid = ((reach >> t) & 1) == 1
+            if not valid.any():
+                continue
+            new_own = base | BIT[t]
+            mill = ((new_own & MILL_FIRST[t]) == MILL_FIRST[t]) | ((new_own & MILL_SECOND[t]) == MILL_SECOND[t])
+            plain = np.flatnonzero(valid & ~mill)
+            if len(plain):
+                yield plain, "move", rank_many(opp_bits[plain], new_own[plain], opp, own)
+            milled = np.flatnonzero(valid & mill)
+            if not len(milled):
+                continue
+            if opp - 1 < MIN_PIECES:
+                yield milled, "win", None
+                continue
+            for r in opp_points:
+                r_bits = BIT[r[milled]]
+                ok = (removable[milled] & r_bits) != 0
+                rows = milled[ok]
+                if len(rows):
+                    yield rows, "mill", rank_many(opp_bits[rows] ^ r_bits[ok], new_own[rows], opp - 1, own)
+
+
+class _Table:
+    def __init__(self, own, opp):
+        self.own = own
+        self.opp = opp
+        self.size = table_size(own, opp)
+        self.result = np.zeros(self.size, dtype=np.int8)
+        self.dtr = np.zeros(self.size, dtype=np.uint8)
+
+
+def _static_pass(table, solved, positions=None):
+    """
+    Fold the options into already solved tables (mills) into per-position
+    bounds, for all positions or just the given indices.
+    """
+    table.static_win = np.full(table.size, UNSET, dtype=np.int16)   # Fastest win through a mill.
+    table.static_loss = np.zeros(table.size, dtype=np.int16)        # Slowest loss through a mill.
+    table.static_draw = np.zeros(table.size, dtype=bool)
+    moves = np.zeros(table.size, dtype=np.int16)
+    if positions is None:
+        positions = np.arange(table.size, dtype=np.int64)
+    for start in range(0, len(positions), CHUNK):
+        indices = positions[start:start + CHUNK]
+        own_bits, opp_bits, own_points, opp_points = unrank_many(indices, table.own, table.opp)
+        for rows, kind, succ in _options(own_bits, opp_bits, own_points, opp_points, table.own, table.opp):
+            at = indices[rows]
+            moves[at] += 1
+            if kind == "win":
+                np.minimum.at(table.static_win, at, 1)
+            elif kind == "mill":
+                target = solved[(table.opp - 1, table.own)]
+                res = target.result[succ]
+                dtr = target.dtr[succ].astype(np.int16) + 1
+                loss = res == LOSS
+                np.minimum.at(table.static_win, at[loss], dtr[loss])
+                win = res == WIN
+                np.maximum.at(table.static_loss, at[win], dtr[win])
+                table.static_draw[at[res == DRAW]] = True
+    # A mill that wins at any level rules out the position being lost.
+    table.static_has_win = table.static_win < UNSET
+    # Blocked positions are lost on the spot.
+    blocked = positions[moves[positions] == 0]
+    table.result[blocked] = LOSS
+    table.dtr[blocked] = 0
+
+
+def _solve_level(table, partner, level):
+    """Index arrays of the unknown positions of table that are won and lost at this level."""
+    unknown = np.flatnonzero(table.result == DRAW)
+    if not len(unknown):
+        return [], []
+    wins = []
+    losses = []
+    for start in range(0, len(unknown), CHUNK):
+        indices = unknown[start:start + CHUNK]
+        own_bits, opp_bits, own_points, opp_points = unrank_many(indices, table.own, table.opp)
+        has_win = table.static_win[indices] == level
+        all_win = (~table.static_draw[indices] & ~table.static_has_win[indices]
+                   & (table.static_loss[indices] <= level))
+        for rows, kind, succ in _options(own_bits, opp_bits, own_points, opp_points, table.own, table.opp):
+            if kind != "move":
+                continue
+            res = partner.result[succ]
+            dtr = partner.dtr[succ]
+            has_win[rows[(res == LOSS) & (dtr == level - 1)]] = True
+            bad = rows[~((res == WIN) & (dtr <= level - 1))]
+            all_win[bad] = False
+        wins.append(indices[has_win])
+        losses.append(indices[all_win & ~has_win])
+    return wins, losses
+
+
+def solve(max_pieces=MIN_PIECES, directory="tablebase", log=print):
+    """Solve and write every table with MIN_PIECES..max_pieces per side."""
+    os.makedirs(directory, exist_ok=True)
+    solved = {}
+    for total in range(2 * MIN_PIECES, 2 * max_pieces + 1):
+        pairs = [(a, total - a) for a in range(MIN_PIECES, max_pieces + 1)
+                 if MIN_PIECES <= total - a <= max_pieces]
+        tables = {pair: _Table(*pair) for pair in pairs}
+        start = time.time()
+        for table in tables.values():
+            _static_pass(table, solved)
+        # Mill options into smaller tables can still decide a position at
+        # any level up to the longest result they lead to.
+        horizon = max(max(int(t.static_loss.max()), int(t.static_win[t.static_win < UNSET].max(initial=0)))
+                      for t in tables.values())
+        level = 1
+        while True:
+            # Decide the whole level from the previous one before writing any of it.
+            updates = []
+            for (a, b), table in tables.items():
+                updates.append((table,) + _solve_level(table, tables[(b, a)], level))
+            changes = 0
+            for table, wins, losses in updates:
+                for found, result in ((wins, WIN), (losses, LOSS)):
+                    for indices in found:
+                        table.result[indices] = result
+                        table.dtr[indices] = min(level, 255)
+                        changes += len(indices)
+            if not changes and level >= horizon:
+                break
+            level += 1
+        for table in tables.values():
+            write_table(directory, table)
+            counts = np.bincount(table.result, minlength=3)
+            log(f"table {table.own}v{table.opp}: {table.size} positions, {counts[WIN]} wins, "
+                f"{counts[LOSS]} losses, {counts[DRAW]} draws, longest {int(table.dtr.max())} plies "
+                f"({time.time() - start:.1f}s)")
+            solved[(table.own, table.opp)] = table
+    return solved
+
+
+def _path(directory, own, opp, kind):
+    return os.path.join(directory, f"{'wdl' if kind == KIND_WDL else 'dtr'}_{own}{opp}.bin")
+
+
+def write_table(directory, table):
+    padded = np.zeros(-(-table.size // 4) * 4, dtype=np.uint8)
+    padded[:table.size] = table.result
+    packed = padded[0::4] | padded[1::4] << 2 | padded[2::4] << 4 | padded[3::4] << 6
+    for kind, payload in ((KIND_WDL, packed), (KIND_DTR, table.dtr)):
+        with open(_path(directory, table.own, table.opp, kind), "wb") as f:
+            f.write(HEADER.pack(MAGIC, table.own, table.opp, kind, 0, table.size))
+            f.write(payload.astype(np.uint8).tobytes())
+
+
+class Tablebase:
+    """Memory-mapped probing of the tables written by solve()."""
+
+    def __init__(self, directory="tablebase"):
+        self.wdl = {}
+        self.dtr = {}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".bin") or name[:4] not in ("wdl_", "dtr_"):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                magic, own, opp, kind, _, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a tablebase file")
+            data = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size)
+            (self.wdl if kind == KIND_WDL else self.dtr)[(own, opp)] = data
+        self.max_pieces = max((max(key) for key in self.wdl), default=0)
+
+    def covers(self, board):
+        if board.placed[0] != TOTAL_PIECES or board.placed[1] != TOTAL_PIECES:
+            return False
+        counts = (popcount(board.pieces[board.current]), popcount(board.pieces[1 - board.current]))
+        return board.phase in (MOVING, REMOVAL) and counts in self.wdl
+
+    def probe(self, board):
+        """(result, plies to result) for the side to move in the moving phase, or None if not covered."""
+        if board.phase != MOVING or board.placed[0] != TOTAL_PIECES or board.placed[1] != TOTAL_PIECES:
+            return None
+        own_bits, opp_bits = board.pieces[board.current], board.pieces[1 - board.current]
+        return self.probe_bits(own_bits, opp_bits)
+
+    def probe_bits(self, own_bits, opp_bits):
+        own, opp = popcount(own_bits), popcount(opp_bits)
+        if own < MIN_PIECES:
+            return LOSS, 0
+        if opp < MIN_PIECES:
+            return WIN, 0
+        wdl = self.wdl.get((own, opp))
+        if wdl is None:
+            return None
+        index = rank(own_bits, opp_bits, own, opp)
+        result = (int(wdl[index >> 2]) >> ((index & 3) * 2)) & 3
+        return result, int(self.dtr[(own, opp)][index])
+
+    def _after(self, board):
+        # Value of the position after a completed option, for the player who chose it.
+        probed = self.probe(board) if board.phase == MOVING else None
+        if board.winner() is not None:
+            return (WIN, 0) if board.winner() != board.current else (LOSS, 0)
+        if probed is None:
+            return None
+        result, dtr = probed
+        return ({WIN: LOSS, LOSS: WIN, DRAW: DRAW}[result], dtr)
+
+    def best_move(self, board):
+        """
+        The move with the best tablebase result for the side to move in the
+        moving or removal phase: the fastest win, else a draw, else the
+        slowest loss. None if the position or a successor is not covered.
+        After a mill-closing move the removal is its own call in REMOVAL.
+        """
+        if not self.covers(board):
+            return None
+        best = None
+        best_key = None
+        for move in board.legal_moves():
+            board.make_move(move)
+            if board.phase == REMOVAL:
+                outcomes = []
+                for removal in board.legal_moves():
+                    board.make_move(removal)
+                    outcomes.append(self._after(board))
+                    board.undo_move()
+            else:
+                outcomes = [self._after(board)]
+            board.undo_move()
+            if None in outcomes:
+                return None
+            key = max(_preference(result, dtr) for result, dtr in outcomes)
+            if best_key is None or key > best_key:
+                best, best_key = move, key
+        return best
+
+
+def _preference(result, dtr):
+    if result == WIN:
+        return (2, -dtr)
+    if result == DRAW:
+        return (1, 0)
+    return (0, dtr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe the moving-phase endgame tablebase.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("directory", nargs="?", default="tablebase")
+    build.add_argument("--max-pieces", type=int, default=MIN_PIECES, help="pieces per side (3 or 4)")
+    probe = sub.add_parser("probe")
+    probe.add_argument("directory", nargs="?", default="tablebase")
+    probe.add_argument("--random", type=int, default=5, help="probe this many random positions")
+    probe.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        solve(args.max_pieces, args.directory)
+        return 0
+    import random
+    from engine import Board
+    tb = Tablebase(args.directory)
+    rng = random.Random(args.seed)
+    for _ in range(args.random):
+        own, opp = rng.randint(MIN_PIECES, tb.max_pieces), rng.randint(MIN_PIECES, tb.max_pieces)
+        points = rng.sample(range(NUM_POINTS), own + opp)
+        board = Board(rng.choice((0, 1)))
+        board.placed = [TOTAL_PIECES, TOTAL_PIECES]
+        board.phase = MOVING
+        board.pieces[board.current] = sum(1 << p for p in points[:own])
+        board.pieces[1 - board.current] = sum(1 << p for p in points[own:])
+        board.recount()
+        result, dtr = tb.probe(board)
+        move = tb.best_move(board)
+        print(board)
+        print(f"  {RESULT_NAMES[result]} in {dtr} plies, best {move_to_str(move) if move is not None else '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
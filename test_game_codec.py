@@ -0,0 +1,37 @@
+import numpy as np
+
+from engine import PLACE, POINTS, X, O
+from game_codec import append_game, decode_all, encode_moves, iter_games
+
+
+def test_decode_all_stops_at_odd_byte_tail(tmp_path):
+    path = str(tmp_path / "games.bin")
+    append_game(path, encode_moves([PLACE << 10 | 3, PLACE << 10 | 7], [X, O], 'X'))
+    append_game(path, encode_moves([PLACE << 10 | 5], [O], None))
+    with open(path, "ab") as f:
+        f.write(b"\x02")  # First byte of a header cut off mid-append.
+
+    arrays = decode_all(path)
+    games = list(iter_games(path))
+    assert len(games) == 2
+    assert arrays["length"].tolist() == [2, 1]
+    assert arrays["winner"].tolist() == [1, 0]
+    assert np.array_equal(arrays["to"], [3, 7, 5])
+    assert [move["to"] for game in games for move in game["moves"]] == [POINTS[3], POINTS[7], POINTS[5]]
+
+
+def test_append_after_torn_record_keeps_later_games(tmp_path):
+    path = str(tmp_path / "games.bin")
+    first = encode_moves([PLACE << 10 | 3, PLACE << 10 | 7], [X, O], 'X')
+    append_game(path, first)
+    with open(path, "ab") as f:
+        f.write(encode_moves([PLACE << 10 | 1] * 4, [X, O, X, O], 'O')[:9])  # Crash mid-record.
+    append_game(path, encode_moves([PLACE << 10 | 5], [O], None))
+    append_game(path, encode_moves([PLACE << 10 | 6, PLACE << 10 | 8], [X, O], 'O'))
+
+    arrays = decode_all(path)
+    games = list(iter_games(path))
+    assert arrays["length"].tolist() == [2, 1, 2]
+    assert arrays["winner"].tolist() == [1, 0, 2]
+    assert np.array_equal(arrays["to"], [3, 7, 5, 6, 8])
+    assert [len(game["moves"]) for game in games] == [2, 1, 2]
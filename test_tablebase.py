@@ -0,0 +1,70 @@
+import numpy as np
+
+from engine import FULL_MASK, MILL_MASKS, NUM_POINTS
+from tablebase import DRAW, LOSS, WIN, _solve_level, _static_pass, _Table, rank, unrank_many
+
+
+def random_results(table, rng, p, max_dtr):
+    table.result[:] = rng.choice([DRAW, WIN, LOSS], size=table.size, p=p)
+    table.dtr[:] = rng.integers(0, max_dtr, size=table.size)
+
+
+def brute_force(own_bits, opp_bits, partner, smaller):
+    """(result, dtr) of a 3v4 position straight from its options' successors."""
+    empty = FULL_MASK & ~(own_bits | opp_bits)
+    in_mills = 0
+    for mask in MILL_MASKS:
+        if opp_bits & mask == mask:
+            in_mills |= mask
+    removable = opp_bits & ~in_mills or opp_bits
+    outcomes = []
+    for frm in range(NUM_POINTS):
+        if not own_bits >> frm & 1:
+            continue
+        for to in range(NUM_POINTS):  # Three pieces fly.
+            if not empty >> to & 1:
+                continue
+            new_own = own_bits ^ 1 << frm | 1 << to
+            if any(new_own & mask == mask and mask >> to & 1 for mask in MILL_MASKS):
+                for r in range(NUM_POINTS):
+                    if removable >> r & 1:
+                        i = rank(opp_bits ^ 1 << r, new_own, 3, 3)
+                        outcomes.append((smaller.result[i], smaller.dtr[i]))
+            else:
+                i = rank(opp_bits, new_own, 4, 3)
+                outcomes.append((partner.result[i], partner.dtr[i]))
+    wins = [dtr for res, dtr in outcomes if res == LOSS]
+    if wins:
+        return WIN, min(wins) + 1
+    if all(res == WIN for res, _ in outcomes):
+        return LOSS, max(dtr for _, dtr in outcomes) + 1
+    return DRAW, 0
+
+
+def test_3v4_levels_match_brute_force():
+    rng = np.random.default_rng(1)
+    # Plain moves mostly lose fast, mills often win slowly: the case where a
+    # late mill win must keep the position from being counted as lost.
+    smaller = _Table(3, 3)
+    random_results(smaller, rng, (0.05, 0.45, 0.5), 40)
+    partner = _Table(4, 3)
+    random_results(partner, rng, (0.01, 0.98, 0.01), 8)
+    table = _Table(3, 4)
+    positions = np.sort(rng.choice(table.size, 200, replace=False))
+    table.result[:] = WIN  # Only the sampled positions are left to solve.
+    table.result[positions] = DRAW
+    _static_pass(table, {(3, 3): smaller}, positions)
+    for level in range(1, 50):
+        wins, losses = _solve_level(table, partner, level)
+        for found, result in ((wins, WIN), (losses, LOSS)):
+            for indices in found:
+                table.result[indices] = result
+                table.dtr[indices] = level
+
+    own_bits, opp_bits, _, _ = unrank_many(positions, 3, 4)
+    late_mill_wins = 0
+    for i, own, opp in zip(positions, own_bits.tolist(), opp_bits.tolist()):
+        expected = brute_force(own, opp, partner, smaller)
+        assert (table.result[i], table.dtr[i] if expected[0] != DRAW else 0) == expected
+        late_mill_wins += expected[0] == WIN and table.static_win[i] == expected[1]
+    assert late_mill_wins
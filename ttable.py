@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Fixed-size transposition table keyed by the engine's 64-bit Zobrist hash.
+
+The table is two flat arrays of unsigned 64-bit words (the hash and a packed
+entry per slot), sized from a memory budget in MB. Each hash maps to a pair
+of slots: the first keeps the deepest result (it is only replaced by an
+equal or deeper search, or once it is left over from an older search), the
+second is always replaced. A packed entry holds the score, search depth,
+bound type, best move and the search generation.
+
+Optionally the table also caches network outputs (e.g. the DQN's 24
+Q-values) per position and model version in a float32 array alongside, so
+outputs of older weights are never returned, and can keep the exact
+Board.key() of every entry to count true hash collisions, which a 64-bit
+compare alone cannot see. stats() reports hit rate, replacements and
+occupancy for sizing.
+
+    python ttable.py --mb 64 --time 5
+"""
+import argparse
+import array
+import sys
+
+import numpy as np
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+ENTRY_BYTES = 16  # Hash word and data word.
+# Data word layout.
+SCORE_BITS = 24
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+DEPTH_SHIFT = 24
+BOUND_SHIFT = 32
+MOVE_SHIFT = 34
+GENERATION_SHIFT = 46
+
+
+class TranspositionTable:
+    def __init__(self, mb=16, q_size=0, verify=False):
+        """
+        mb is the budget for the hash and entry words; q_size > 0 adds a
+        float32 array of that many outputs per entry (counted separately).
+        verify keeps the exact position key per entry to detect collisions.
+        """
+        self.slots = max(int(mb * (1 << 20)) // (2 * ENTRY_BYTES), 1)
+        size = 2 * self.slots
+        self.keys = array.array('Q', bytes(8 * size))
+        self.data = array.array('Q', bytes(8 * size))
+        self.q_size = q_size
+        self.q_values = np.zeros((size, q_size), dtype=np.float32) if q_size else None
+        self.q_keys = array.array('Q', bytes(8 * size)) if q_size else None
+        # Model version + 1 per cached output, so 0 marks an empty slot.
+        self.q_versions = array.array('Q', bytes(8 * size)) if q_size else None
+        self.exact = array.array('Q', bytes(8 * size)) if verify else None
+        self.generation = 1
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replaced = 0       # Stores that evicted a different position.
+        self.collisions = 0     # Hits whose exact key disagreed (verify only).
+        self.q_probes = 0
+        self.q_hits = 0
+
+    def clear(self):
+        self.keys = array.array('Q', bytes(8 * len(self.keys)))
+        self.data = array.array('Q', bytes(8 * len(self.data)))
+        if self.q_size:
+            self.q_keys = array.array('Q', bytes(8 * len(self.q_keys)))
+            self.q_versions = array.array('Q', bytes(8 * len(self.q_versions)))
+        if self.exact is not None:
+            self.exact = array.array('Q', bytes(8 * len(self.exact)))
+        self.generation = 1
+        self.reset_stats()
+
+    def new_search(self):
+        """Age the table: entries from earlier searches become replaceable first."""
+        self.generation = self.generation % 255 + 1
+
+    def probe(self, key, exact_key=None):
+        """(score, depth, bound, move) stored for key, or None. move is None if none was stored."""
+        self.probes += 1
+        i = (key % self.slots) << 1
+        keys = self.keys
+        if keys[i] != key:
+            i += 1
+            if keys[i] != key:
+                return None
+        data = self.data[i]
+        if not data:
+            return None
+        if self.exact is not None and exact_key is not None and self.exact[i] != exact_key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        move = (data >> MOVE_SHIFT) & 0xFFF
+        return ((data & 0xFFFFFF) - SCORE_OFFSET, (data >> DEPTH_SHIFT) & 0xFF,
+                (data >> BOUND_SHIFT) & 3, move - 1 if move else None)
+
+    def store(self, key, score, depth, bound, move=None, exact_key=None):
+        self.stores += 1
+        # Moves are kept off by one so that 0 means none (move code 0 is placing on a1).
+        move = move + 1 if move is not None else 0
+        i = (key % self.slots) << 1
+        keys = self.keys
+        data = self.data
+        generation = self.generation
+        old = data[i]
+        # The depth-preferred slot takes the entry if it is the same position,
+        # empty, stale, or no deeper; otherwise it goes to the always-replace slot.
+        if (keys[i] != key and old and (old >> GENERATION_SHIFT) == generation
+                and (old >> DEPTH_SHIFT) & 0xFF > depth):
+            i += 1
+            old = data[i]
+        if keys[i] != key:
+            if old:
+                self.replaced += 1
+        elif not move:
+            move = (old >> MOVE_SHIFT) & 0xFFF  # Keep the best move of a shallower result.
+        keys[i] = key
+        data[i] = ((score + SCORE_OFFSET) | min(depth, 255) << DEPTH_SHIFT | bound << BOUND_SHIFT
+                   | move << MOVE_SHIFT | generation << GENERATION_SHIFT)
+        if self.exact is not None and exact_key is not None:
+            self.exact[i] = exact_key
+
+    def probe_q(self, key, version=0):
+        """Network outputs cached for key by the model at version, or None."""
+        self.q_probes += 1
+        i = (key % self.slots) << 1
+        q_keys = self.q_keys
+        q_versions = self.q_versions
+        version += 1
+        if q_keys[i] != key or q_versions[i] != version:
+            i += 1
+            if q_keys[i] != key or q_versions[i] != version:
+                return None
+        self.q_hits += 1
+        return self.q_values[i]
+
+    def store_q(self, key, values, version=0):
+        i = (key % self.slots) << 1
+        q_keys = self.q_keys
+        q_versions = self.q_versions
+        if q_keys[i] != key and q_versions[i]:
+            # The newest entry goes first; the one it displaces moves to the second slot.
+            q_keys[i + 1] = q_keys[i]
+            q_versions[i + 1] = q_versions[i]
+            self.q_values[i + 1] = self.q_values[i]
+        q_keys[i] = key
+        q_versions[i] = version + 1
+        self.q_values[i] = values
+
+    def memory(self):
+        """Bytes used by the table arrays."""
+        total = self.keys.itemsize * (len(self.keys) + len(self.data))
+        if self.q_size:
+            total += self.q_values.nbytes + self.q_keys.itemsize * (len(self.q_keys) + len(self.q_versions))
+        if self.exact is not None:
+            total += self.exact.itemsize * len(self.exact)
+        return total
+
+    def stats(self):
+        data = np.frombuffer(self.data, dtype=np.uint64)
+        used = np.count_nonzero(data)
+        current = np.count_nonzero((data >> np.uint64(GENERATION_SHIFT)) == self.generation)
+        stats = {
+            "entries": len(data),
+            "used": used,
+            "current": current,
+            "fill": used / len(data),
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "stores": self.stores,
+            "replaced": self.replaced,
+            "mb": self.memory() / (1 << 20),
+        }
+        if self.exact is not None:
+            stats["collisions"] = self.collisions
+        if self.q_size:
+            stats["q_probes"] = self.q_probes
+            stats["q_hit_rate"] = self.q_hits / self.q_probes if self.q_probes else 0.0
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a few positions and report table statistics.")
+    parser.add_argument("--mb", type=float, default=16, help="table size in MB")
+    parser.add_argument("--time", type=float, default=2.0, help="seconds per position")
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--random-plies", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import random
+    from engine import Board
+    from search import Searcher
+
+    rng = random.Random(args.seed)
+    table = TranspositionTable(args.mb, verify=True)
+    searcher = Searcher(table)
+    for _ in range(args.positions):
+        board = Board(rng.choice((0, 1)))
+        for _ in range(args.random_plies):
+            moves = board.legal_moves()
+            if not moves or board.winner() is not None:
+                break
+            board.make_move(rng.choice(moves))
+        print(searcher.search(board, args.time))
+    for name, value in table.stats().items():
+        print(f"{name:>10}: {value:.4g}" if isinstance(value, float) else f"{name:>10}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
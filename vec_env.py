@@ -0,0 +1,174 @@
+"""
+Vectorized Morabaraba environment that steps N games at once with NumPy.
+
+Boards are an (N, 24) int8 array in engine.POINTS order with 1 for X, -1 for
+O and 0 for empty. Observations are the board from the side to move's view
+(1 own, -1 opponent), the same encoding DeepQAgent.get_state_tensor builds,
+so a batch of observations can go straight through policy_net.
+
+Actions are ints in [0, 24 * 24): action = from * 24 + to. Placing and
+removal only use the target point, so their legal actions are 0..23 and map
+one-to-one onto the DQN's 24 outputs. Rewards follow runv4Revised.py: 5.0
+for forming a mill, the mill-setup and block shaping bonus for other
+placements and 1.0 to the player whose move wins the game.
+"""
+import numpy as np
+
+from engine import (ADJ_POINTS, MILL_POINTS, MOVING, NUM_POINTS, PLACING,
+                    POINT_MILLS, REMOVAL, TOTAL_PIECES)
+
+NUM_ACTIONS = NUM_POINTS * NUM_POINTS
+
+MILL_IDX = np.array(MILL_POINTS, dtype=np.int64)           # (16, 3)
+POINT_MILL_IDX = np.array(POINT_MILLS, dtype=np.int64)     # (24, 2)
+ADJ = np.zeros((NUM_POINTS, NUM_POINTS), dtype=bool)
+for _frm, _adj in enumerate(ADJ_POINTS):
+    ADJ[_frm, list(_adj)] = True
+
+
+def sample_actions(mask, rng):
+    """Pick one uniformly random legal action per row of a legal-action mask."""
+    scores = np.where(mask, rng.random(mask.shape), -1.0)
+    return scores.argmax(axis=1)
+
+
+class VecMorabarabaEnv:
+    def __init__(self, num_envs, max_plies=400, seed=None):
+        self.num_envs = num_envs
+        self.max_plies = max_plies
+        self.rng = np.random.default_rng(seed)
+        n = num_envs
+        self.board = np.zeros((n, NUM_POINTS), dtype=np.int8)
+        self.current = np.ones(n, dtype=np.int8)           # 1 = X, -1 = O
+        self.phase = np.full(n, PLACING, dtype=np.int8)
+        self.placed = np.zeros((n, 2), dtype=np.int16)     # columns: X, O
+        self.removed = np.zeros((n, 2), dtype=np.int16)
+        self.plies = np.zeros(n, dtype=np.int32)
+        self._rows = np.arange(n)
+
+    def reset(self):
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self.observations()
+
+    def _reset_envs(self, which):
+        k = int(which.sum())
+        if not k:
+            return
+        self.board[which] = 0
+        # Random starting player, like random.choice(['X', 'O']) in the runners.
+        self.current[which] = self.rng.choice(np.array([1, -1], dtype=np.int8), size=k)
+        self.phase[which] = PLACING
+        self.placed[which] = 0
+        self.removed[which] = 0
+        self.plies[which] = 0
+
+    def observations(self):
+        return (self.board * self.current[:, None]).astype(np.float32)
+
+    def _player_col(self, sign):
+        # Column into placed/removed for a player sign (X -> 0, O -> 1).
+        return (sign < 0).astype(np.int64)
+
+    def _in_mill(self, sign):
+        # (N, 24) bool: point holds a piece of `sign` that sits in a completed mill.
+        full = (self.board[:, MILL_IDX] == sign[:, None, None]).all(axis=2)   # (N, 16)
+        return full[:, POINT_MILL_IDX].any(axis=2)
+
+    def legal_mask(self):
+        """(N, 24 * 24) bool mask of legal actions for every env."""
+        n = self.num_envs
+        mask = np.zeros((n, NUM_POINTS, NUM_POINTS), dtype=bool)
+        empty = self.board == 0
+        own = self.board == self.current[:, None]
+
+        placing = self.phase == PLACING
+        mask[placing, 0, :] = empty[placing]
+
+        removal = self.phase == REMOVAL
+        if removal.any():
+            opp_sign = -self.current[removal]
+            opp = self.board[removal] == opp_sign[:, None]
+            free = opp & ~self._in_mill(-self.current)[removal]
+            has_free = free.any(axis=1, keepdims=True)
+            mask[removal, 0, :] = np.where(has_free, free, opp)
+
+        moving = self.phase == MOVING
+        if moving.any():
+            flying = own[moving].sum(axis=1) <= 3
+            reach = ADJ[None, :, :] | flying[:, None, None]
+            mask[moving] = own[moving][:, :, None] & empty[moving][:, None, :] & reach
+        return mask.reshape(n, NUM_ACTIONS)
+
+    def _shaping(self, sign):
+        # Vectorized calculate_mill_setup_reward + calculate_block_opponent_reward.
+        cells = self.board[:, MILL_IDX]                          # (N, 16, 3)
+        own = (cells == sign[:, None, None]).sum(axis=2)
+        opp = (cells == -sign[:, None, None]).sum(axis=2)
+        empty = 3 - own - opp
+        setup = 2.0 * ((own == 2) & (empty == 1)).sum(axis=1) + 0.5 * ((own == 1) & (empty == 2)).sum(axis=1)
+        block = 1.5 * ((opp == 2) & (empty == 1)).sum(axis=1)
+        return (setup + block).astype(np.float32)
+
+    def step(self, actions):
+        """
+        Apply one action per env. Returns (obs, rewards, dones, info); rewards go
+        to the player who acted. Finished envs are reset automatically and
+        info["winner"] holds 1 (X), -1 (O) or 0 (unfinished or draw by ply limit).
+        info["actor_obs"] is the post-move board from the actor's view, the
+        next_state DeepQAgent.store_transition records.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        rows = self._rows
+        legal = self.legal_mask()[rows, actions]
+        if not legal.all():
+            raise ValueError(f"illegal actions in envs {np.flatnonzero(~legal).tolist()}")
+        frm, to = np.divmod(actions, NUM_POINTS)
+        cur = self.current.copy()
+        col = self._player_col(cur)
+        phase = self.phase.copy()
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+
+        removing = phase == REMOVAL
+        moving = phase == MOVING
+        placing = phase == PLACING
+
+        self.board[rows[moving], frm[moving]] = 0
+        self.board[rows[removing], to[removing]] = 0
+        self.removed[rows[removing], 1 - col[removing]] += 1
+        adding = ~removing
+        self.board[rows[adding], to[adding]] = cur[adding]
+        self.placed[rows[placing], col[placing]] += 1
+
+        # Only the two mills through the target point can have closed.
+        lines = self.board[rows[:, None, None], MILL_IDX[POINT_MILL_IDX[to]]]   # (N, 2, 3)
+        formed = adding & (lines == cur[:, None, None]).all(axis=2).any(axis=1)
+        formed &= (self.board == -cur[:, None]).any(axis=1)
+        rewards[formed] = 5.0
+        shaped = placing & ~formed
+        if shaped.any():
+            rewards[shaped] = self._shaping(cur)[shaped]
+
+        all_placed = (self.placed == TOTAL_PIECES).all(axis=1)
+        self.phase = np.where(formed, REMOVAL, np.where(all_placed, MOVING, PLACING)).astype(np.int8)
+        self.current = np.where(formed, cur, -cur).astype(np.int8)
+        self.plies += 1
+        actor_obs = (self.board * cur[:, None]).astype(np.float32)
+
+        winner = self._winners()
+        won = winner != 0
+        rewards[won & (winner == cur)] += 1.0
+        dones = won | (self.plies >= self.max_plies)
+        info = {"winner": winner, "actor_obs": actor_obs, "actor": cur}
+        self._reset_envs(dones)
+        return self.observations(), rewards, dones, info
+
+    def _winners(self):
+        counts = np.stack([(self.board == 1).sum(axis=1), (self.board == -1).sum(axis=1)], axis=1)
+        lost = (self.placed == TOTAL_PIECES) & (counts < 3)                    # (N, 2)
+        winner = np.where(lost[:, 0], -1, np.where(lost[:, 1], 1, 0)).astype(np.int8)
+        # A player with no legal move in the moving phase loses.
+        moving = (self.phase == MOVING) & (winner == 0)
+        if moving.any():
+            blocked = moving & ~self.legal_mask().any(axis=1)
+            winner[blocked] = -self.current[blocked]
+        return winner